@@ -1,5 +1,7 @@
-from .db import engine
+from .db import engine, warm_pool
 from .models import Base
 
-def init_db():
+def init_db(warm: bool = True):
     Base.metadata.create_all(bind=engine)
+    if warm:
+        warm_pool()
@@ -1,6 +1,6 @@
-from app.providers.base import CabsProvider
+from app.providers.base import CabsProvider, RESULTS_TOP_N
 
 def run_cabs_agent(provider: CabsProvider, pickup: str, dropoff: str) -> dict:
     cabs = provider.search_cabs(pickup, dropoff)
     cheapest = cabs[0] if cabs else None
-    return {"cabs": cabs, "cheapest": cheapest}
+    return {"cabs": cabs[:RESULTS_TOP_N], "cheapest": cheapest, "total": len(cabs)}
@@ -1,10 +1,15 @@
 # app/agents/covid.py
 from __future__ import annotations
 
+from datetime import datetime, timezone
+from operator import itemgetter
 from typing import Any, Dict
 
 from app.providers.disease_covid import DiseaseCovidProvider, CovidProviderError
 
+_UTC = timezone.utc
+_DATE_AND_CASES = itemgetter("date", "new_cases")
+
 
 def run_covid_agent(provider: DiseaseCovidProvider, location: str) -> Dict[str, Any]:
     """
@@ -18,8 +23,7 @@ def run_covid_agent(provider: DiseaseCovidProvider, location: str) -> Dict[str,
     updated_str = None
     try:
         if updated_ms:
-            import datetime
-            updated_str = datetime.datetime.utcfromtimestamp(int(updated_ms) / 1000).strftime("%Y-%m-%d %H:%M UTC")
+            updated_str = datetime.fromtimestamp(int(updated_ms) / 1000, _UTC).strftime("%Y-%m-%d %H:%M UTC")
     except Exception:
         pass
 
@@ -27,7 +31,7 @@ def run_covid_agent(provider: DiseaseCovidProvider, location: str) -> Dict[str,
     last14 = bundle.get("last14_days") or []
 
     # Prepare a chart-friendly series
-    series = [{"x": p["date"], "y": p["new_cases"]} for p in last14]
+    series = [{"x": x, "y": y} for x, y in map(_DATE_AND_CASES, last14)]
 
     return {
         "location": bundle.get("country") or location,
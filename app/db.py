@@ -1,6 +1,35 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 import os
 
-engine = create_engine(os.environ["DATABASE_URL"], pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
\ No newline at end of file
+# Explicit pool sizing instead of the 5 + 10 default; override per deployment.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or 20)
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW") or 10)
+
+engine = create_engine(
+    os.environ["DATABASE_URL"],
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
+# The /chat path holds no ORM objects across a commit (it selects the context
+# column and writes turns through Core statements), so expire_on_commit=False
+# has no effect there; it stays so any ORM object read after commit is not
+# reloaded with an extra SELECT.
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+
+
+def warm_pool(n: int = POOL_SIZE):
+    """
+    Open n pooled connections up front so the first requests skip the connect handshake.
+    """
+    conns = []
+    try:
+        for _ in range(n):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            conns.append(conn)
+    finally:
+        for conn in conns:
+            conn.close()
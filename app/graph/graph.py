@@ -1,9 +1,22 @@
 # app/graph/graph.py
+import hashlib
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cache
+
 import pycountry
 from langgraph.graph import StateGraph, END
 
-from app.graph.state import TravelState
+from app.graph.state import QKey, TravelState
 from app.llm.dialogue_manager import plan_next_step
+from app.utils.country import iso2_to_country_name
 
 # Providers
 from app.providers.amadeus_flights import (
@@ -21,6 +34,7 @@ from app.providers.amadeus_cabs import (
 from app.providers.disease_covid import DiseaseCovidProvider
 
 # Agents
+from app.agents.flights import run_flights_agent
 from app.agents.hotels import run_hotels_agent
 from app.agents.cabs import run_cabs_agent
 from app.agents.covid import run_covid_agent
@@ -29,52 +43,242 @@ from app.agents.covid import run_covid_agent
 # ---------------------------
 # Providers init
 # ---------------------------
-flights_provider = AmadeusFlightsProvider()
-hotels_provider = AmadeusHotelsProvider()
-cabs_provider = AmadeusCabsProvider()
-covid_provider = DiseaseCovidProvider()
+# Lazy singletons: importing the graph (tests, scripts) doesn't build clients
+# or sessions until a node actually needs one.
+@cache
+def flights_provider() -> AmadeusFlightsProvider:
+    return AmadeusFlightsProvider()
+
+
+@cache
+def hotels_provider() -> AmadeusHotelsProvider:
+    return AmadeusHotelsProvider()
+
+
+@cache
+def cabs_provider() -> AmadeusCabsProvider:
+    return AmadeusCabsProvider()
+
+
+@cache
+def covid_provider() -> DiseaseCovidProvider:
+    return DiseaseCovidProvider()
+
+
+# Tool nodes are network-bound (Amadeus / disease.sh), so sibling branches of a
+# fan-out run on threads: wall-clock ~= max(t_i) instead of sum(t_i).
+# Shared by all concurrent requests (one branch per fan-out runs on the request
+# thread itself), so size it for concurrent fan-outs x (branches - 1).
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS") or 16)
+_FANOUT_POOL = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+# Speculative covid fetches kicked off once a destination country is known;
+# the "Hotel or COVID?" follow-up usually lands after they finished.
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+_COVID_PREFETCH: dict = {}  # normalized country -> in-flight Future
+_COVID_PREFETCH_LOCK = threading.Lock()
 
 
 # ---------------------------
 # Utilities
 # ---------------------------
+# In-state trace is a short ring buffer (it travels with every checkpoint and
+# response); set TRACE_LOG_PATH to get every event as JSONL, written off-thread.
+_TRACE_MAX = 20
+_TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH") or None
+_TRACE_SINK: "queue.SimpleQueue | None" = queue.SimpleQueue() if _TRACE_LOG_PATH else None
+
+
+def _trace_writer(path: str, sink: queue.SimpleQueue) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        while True:
+            f.write(json.dumps(sink.get(), ensure_ascii=False, default=str) + "\n")
+            if sink.empty():
+                f.flush()
+
+
+if _TRACE_SINK is not None:
+    threading.Thread(target=_trace_writer, args=(_TRACE_LOG_PATH, _TRACE_SINK), name="trace-sink", daemon=True).start()
+
+
+def _trace(state: TravelState) -> deque:
+    # bounded like history; converted back to a list when the turn is saved
+    trace = state.get("trace")
+    if not (isinstance(trace, deque) and trace.maxlen == _TRACE_MAX):
+        trace = deque(trace or (), maxlen=_TRACE_MAX)
+        state["trace"] = trace
+    return trace
+
+
 def add_trace(state: TravelState, node: str, detail: dict):
-    state.setdefault("trace", [])
-    state["trace"].append({"node": node, "detail": detail})
+    event = {"node": node, "detail": detail}
+    _trace(state).append(event)
+    if _TRACE_SINK is not None:
+        _TRACE_SINK.put({"ts": time.time(), "conversation_id": state.get("conversation_id"), **event})
+
+
+def _slots(state: TravelState) -> dict:
+    return state.get("slots") or {}
+
+
+def _node_ctx(state: TravelState) -> dict:
+    """
+    The turn's context, owned by the graph and mutated in place by every node.
+    node_master_llm makes the single copy of convo_context at graph entry;
+    if a node runs without it, the copy is made here once instead.
+    """
+    ctx = state.get("updated_context")
+    if ctx is None:
+        ctx = state["updated_context"] = dict(state.get("convo_context") or {})
+    return ctx
+
+
+_HISTORY_MAX = 30
 
 
 def _ctx_history_append(ctx: dict, role: str, content: str):
-    hist = ctx.get("history") or []
+    # deque(maxlen) evicts in O(1); converted back to a list when the context is saved
+    hist = ctx.get("history")
+    if not (isinstance(hist, deque) and hist.maxlen == _HISTORY_MAX):
+        hist = deque(hist or (), maxlen=_HISTORY_MAX)
+    # absolute message count, so the planner can keep its history window aligned
+    ctx["history_seq"] = ctx.get("history_seq", len(hist)) + 1
     hist.append({"role": role, "content": content})
-    ctx["history"] = hist[-30:]
+    ctx["history"] = hist
+
+
+def _reply(state: TravelState, ctx: dict, text: str, trace_node: str, trace_detail: dict,
+           next_q: str | None = None, question_key: str | None = None) -> TravelState:
+    """
+    Common tail of every tool-node exit: reply, trace, history, persist.
+    """
+    state["reply"] = text
+    state["next_question"] = next_q or text
+    add_trace(state, trace_node, trace_detail)
+    _ctx_history_append(ctx, "assistant", text)
+    ctx["last_reply"] = text
+    if question_key:
+        ctx["last_question_key"] = question_key
+    return _persist_context(state, ctx)
+
+
+def _summarize_results(results: dict) -> dict:
+    # kind -> {count, cheapest[, location]}: enough for the planner, a fraction of the bytes
+    out = {}
+    for kind, data in (results or {}).items():
+        if not isinstance(data, dict):
+            continue
+        count = data["total"] if "total" in data else len(data.get(kind) or ())
+        summary = {"count": count, "cheapest": data.get("cheapest")}
+        if data.get("location"):
+            summary["location"] = data["location"]
+        out[kind] = summary
+    return out
 
 
 def _persist_context(state: TravelState, ctx: dict) -> TravelState:
     """
-    Always write back slots/results/history so the LLM has memory.
+    Always write back slots/history (+ a results summary) so the LLM has memory.
+    `ctx` is owned by the calling node, so it is updated in place; slots are
+    stored by reference (read-only once written). Full tool results stay in
+    state["results"] for this turn's response only.
     """
-    ctx = dict(ctx or {})
-    ctx["slots"] = state.get("slots", {}) or {}
-    ctx["results"] = state.get("results", {}) or {}
+    if ctx is None:
+        ctx = {}
+    ctx["slots"] = _slots(state)
+    ctx.pop("results", None)  # contexts saved before results were summarized
+    ctx["results_summary"] = {**(ctx.get("results_summary") or {}), **_summarize_results(state.get("results"))}
     state["updated_context"] = ctx
     return state
 
 
-def _looks_like_yes(txt: str) -> bool:
-    t = (txt or "").strip().lower()
-    return t in {"yes", "y", "sure", "ok", "okay", "haan", "yeah", "yep"}
+def _mutate_slots(state: TravelState, base: dict | None = None, /, **updates) -> dict:
+    """
+    Single write point for slots: builds one new dict from `base` (default:
+    current state slots) plus `updates`. Slot dicts are never mutated in place,
+    so earlier readers can keep holding a reference.
+    """
+    slots = {**(_slots(state) if base is None else base), **updates}
+    state["slots"] = slots
+    return slots
+
+
+_YES = frozenset({"yes", "y", "sure", "ok", "okay", "haan", "yeah", "yep"})
+_NO = frozenset({"no", "n", "nope", "nah"})
+_COVID_RE = re.compile(r"covid|cases|corona")
+_HOTEL_RE = re.compile(r"hotel")
+_BOTH_RE = re.compile(r"both")
+# "all"/"everything" is only the bundle when it is the whole reply or comes
+# with bundle wording; "no, that's all" / "hotel for all of us" are not
+_EVERYTHING_RE = re.compile(
+    r"^(?:all|everything)(?: of (?:it|them)| three)?(?: please)?[.!]*$"
+    r"|\b(?:all three|all of (?:it|them)|everything (?:please|too|as well))\b"
+)
+# after flights, a reply led by "no" that asks for nothing else ("no, that's all",
+# "nope thanks") is a no; "no, but I need a cab" / "no hotel, just covid" are not
+_NO_LEAD_RE = re.compile(r"^(?:no|nope|nah)\b")
+_REQUEST_RE = re.compile(r"covid|cases|corona|hotel|both|flight|cab|taxi|transfer|book")
+
+
+# matchers below take text already stripped + lowercased once in node_master_llm
+def _looks_like_yes(t: str) -> bool:
+    return t in _YES
 
-def _looks_like_no(txt: str) -> bool:
-    t = (txt or "").strip().lower()
-    return t in {"no", "n", "nope", "nah"}
+def _looks_like_no(t: str) -> bool:
+    return t in _NO
 
-def _wants_covid(txt: str) -> bool:
-    t = (txt or "").strip().lower()
-    return ("covid" in t) or ("cases" in t) or ("corona" in t)
+def _declines_after_flight(t: str) -> bool:
+    return t in _NO or (bool(_NO_LEAD_RE.match(t)) and not _REQUEST_RE.search(t))
 
-def _wants_hotel(txt: str) -> bool:
-    t = (txt or "").strip().lower()
-    return ("hotel" in t) or _looks_like_yes(t)
+def _wants_covid(t: str) -> bool:
+    return bool(_COVID_RE.search(t))
+
+def _wants_hotel(t: str) -> bool:
+    return bool(_HOTEL_RE.search(t)) or t in _YES
+
+def _wants_both(t: str) -> bool:
+    return bool(_BOTH_RE.search(t)) or (bool(_COVID_RE.search(t)) and bool(_HOTEL_RE.search(t)))
+
+def _wants_everything(t: str) -> bool:
+    return bool(_EVERYTHING_RE.search(t))
+
+
+def _prefetch_covid(country: str) -> None:
+    """
+    Warm the covid provider's bundle cache in the background. The result is only
+    used if the user actually asks for COVID updates.
+    """
+    key = (country or "").strip().lower()
+    if not key:
+        return
+    provider = covid_provider()
+    with _COVID_PREFETCH_LOCK:
+        if key in _COVID_PREFETCH:
+            return
+        fut = _COVID_PREFETCH[key] = _PREFETCH_POOL.submit(provider.fetch_country_bundle, country)
+    # outside the lock: an already-finished future runs the callback right here
+    fut.add_done_callback(lambda f: _forget_covid_prefetch(key, f))
+
+
+def _forget_covid_prefetch(key: str, fut: Future) -> None:
+    # only this future's own entry; a newer prefetch for the key may have replaced it
+    with _COVID_PREFETCH_LOCK:
+        if _COVID_PREFETCH.get(key) is fut:
+            del _COVID_PREFETCH[key]
+
+
+def _await_covid_prefetch(country: str) -> None:
+    # join an in-flight prefetch instead of issuing the same request twice;
+    # one still queued behind other prefetches/warmups is dropped and the
+    # caller fetches inline rather than waiting for unrelated work
+    with _COVID_PREFETCH_LOCK:
+        fut = _COVID_PREFETCH.get((country or "").strip().lower())
+    if fut is None or fut.cancel():
+        return
+    try:
+        fut.result()
+    except Exception:
+        pass  # the real fetch below retries and surfaces the error
 
 
 def _resolve_country_from_destination(state: TravelState) -> None:
@@ -84,8 +288,10 @@ def _resolve_country_from_destination(state: TravelState) -> None:
       - destination_country_code (ISO2)
       - destination_country (country name)
       - country (country name)  <-- critical for covid flow
+      - destination_country_for (the destination it was resolved from)
+    Idempotent: a no-op when slots already hold the country for this destination.
     """
-    slots = state.get("slots", {}) or {}
+    slots = _slots(state)
     dest = (slots.get("destination") or "").strip()
     if not dest:
         dest = (slots.get("destination_iata") or "").strip()
@@ -94,125 +300,269 @@ def _resolve_country_from_destination(state: TravelState) -> None:
         add_trace(state, "dest_country_skip", {"reason": "missing destination"})
         return
 
+    if slots.get("destination_country_code") and slots.get("destination_country_for") == dest:
+        add_trace(state, "dest_country_skip", {"reason": "already resolved", "country": slots.get("country")})
+        _prefetch_covid(slots.get("country"))
+        return
+
     try:
-        loc = flights_provider.resolve_location_country(dest)  # must use SDK implementation
+        loc = flights_provider().resolve_location_country(dest)  # must use SDK implementation
         cc = (loc or {}).get("countryCode")
         if not cc:
             add_trace(state, "dest_country_not_found", {"destination": dest, "loc": loc})
             return
 
-        country_name = None
-        try:
-            c = pycountry.countries.get(alpha_2=cc.upper())
-            country_name = c.name if c else None
-        except Exception:
-            country_name = None
+        country_name = iso2_to_country_name(cc)
 
         # write back to slots
-        slots["destination_country_code"] = cc.upper()
         if country_name:
-            slots["destination_country"] = country_name
-            slots["country"] = country_name   # ✅ IMPORTANT: what your covid node expects
+            # ✅ IMPORTANT: "country" is what your covid node expects
+            slots = _mutate_slots(state, slots, destination_country_code=cc.upper(), destination_country_for=dest,
+                                  destination_country=country_name, country=country_name)
         else:
             # fallback: at least set country as code so covid node can try
-            slots["country"] = cc.upper()
+            slots = _mutate_slots(state, slots, destination_country_code=cc.upper(), destination_country_for=dest,
+                                  country=cc.upper())
 
-        state["slots"] = slots
         add_trace(state, "dest_country_resolved", {
             "destination": dest,
             "countryCode": slots.get("destination_country_code"),
             "country": slots.get("country"),
         })
+        _prefetch_covid(slots["country"])
 
     except Exception as e:
         add_trace(state, "dest_country_resolve_failed", {"destination": dest, "error": str(e)})
 
 
+# ---------------------------
+# Deterministic follow-up routes
+# ---------------------------
+_ANYTHING_ELSE_Q = "Okay 👍 Anything else you’d like to search (flights/hotels/cabs/covid)?"
+
+# lowercased country name / common name / alpha-3 -> pycountry name
+_COUNTRY_BY_NAME = {
+    n.lower(): c.name
+    for c in pycountry.countries
+    for n in (c.name, getattr(c, "common_name", None), getattr(c, "official_name", None), c.alpha_3)
+    if n
+}
+
+
+def _master_reply(state: TravelState, ctx2: dict, q: str, question_key: str) -> TravelState:
+    state["llm_action"] = "ask_user"
+    state["reply"] = q
+    state["next_question"] = q
+    _ctx_history_append(ctx2, "assistant", q)
+    ctx2["last_reply"] = q
+    ctx2["last_question_key"] = question_key
+    return _persist_context(state, ctx2)
+
+
+def _master_route(state: TravelState, ctx2: dict, action: str, slots: dict, trace_node: str, choice: str) -> TravelState:
+    state["llm_action"] = action
+    state["llm_missing"] = []
+    state["slots"] = slots
+    add_trace(state, trace_node, {"choice": choice, "slots": slots})
+    return _persist_context(state, ctx2)
+
+
+def _route_after_flight(state: TravelState, ctx2: dict, slots: dict, text_lower: str):
+    # start from memory slots
+    merged = dict(slots)
+
+    # before the others: "no, that's all" is a no, not the bundle
+    if _declines_after_flight(text_lower):
+        return _master_reply(state, ctx2, _ANYTHING_ELSE_Q, QKey.OPEN_ENDED)
+
+    if _wants_everything(text_lower):
+        return _master_route(state, ctx2, "flight_bundle", merged, "master_after_flight_route", "flight_bundle")
+
+    if _wants_both(text_lower):
+        # user wants both -> run hotels + covid side by side
+        state["slots"] = merged
+        _resolve_country_from_destination(state)
+        merged = state.get("slots") or merged
+        merged.setdefault("city", merged.get("destination"))
+        merged.setdefault("checkin", merged.get("date"))
+        state["llm_actions"] = ["covid", "hotels"]
+        return _master_route(state, ctx2, "fanout", merged, "master_after_flight_route", "covid+hotels")
+
+    if _wants_covid(text_lower):
+        # ensure country is filled from amadeus (if not already)
+        state["slots"] = merged
+        _resolve_country_from_destination(state)
+        merged = state.get("slots") or merged
+        add_trace(state, "master_slots_seen", {"slots": slots})
+        return _master_route(state, ctx2, "covid", merged, "master_after_flight_route", "covid")
+
+    if _wants_hotel(text_lower):
+        # seed hotel slots from flight info
+        merged.setdefault("city", merged.get("destination"))
+        merged.setdefault("checkin", merged.get("date"))
+        return _master_route(state, ctx2, "hotels", merged, "master_after_flight_route", "hotels")
+
+    # If unclear
+    return _master_reply(state, ctx2, "Please reply with: hotel / covid / both / all / or no.", QKey.AFTER_FLIGHT_NEXT_STEP)
+
+
+def _route_cabs_after_hotels(state: TravelState, ctx2: dict, slots: dict, text_lower: str):
+    if _looks_like_yes(text_lower):
+        merged = dict(slots)
+        # airport -> the hotel just offered; a route left from an earlier
+        # transfer search must not be searched again
+        dest = merged.get("destination") or merged.get("city")
+        if dest:
+            merged["pickup"] = f"{dest} Airport"
+        hotel = ((ctx2.get("results_summary") or {}).get("hotels") or {}).get("cheapest") or {}
+        if hotel.get("name"):
+            merged["dropoff"] = hotel["name"]
+        else:
+            merged.pop("dropoff", None)
+        return _master_route(state, ctx2, "cabs", merged, "master_det_route", "cabs")
+    if _looks_like_no(text_lower):
+        return _master_reply(state, ctx2, _ANYTHING_ELSE_Q, QKey.OPEN_ENDED)
+    return None
+
+
+def _route_hotel_after_covid(state: TravelState, ctx2: dict, slots: dict, text_lower: str):
+    if _looks_like_yes(text_lower):
+        merged = dict(slots)
+        merged.setdefault("city", merged.get("destination"))
+        merged.setdefault("checkin", merged.get("date"))
+        return _master_route(state, ctx2, "hotels", merged, "master_det_route", "hotels")
+    if _looks_like_no(text_lower):
+        return _master_reply(state, ctx2, _ANYTHING_ELSE_Q, QKey.OPEN_ENDED)
+    return None
+
+
+def _route_covid_country(state: TravelState, ctx2: dict, slots: dict, text_lower: str):
+    country = _COUNTRY_BY_NAME.get(text_lower)
+    if not country:
+        return None
+    merged = dict(slots)
+    merged["country"] = country
+    return _master_route(state, ctx2, "covid", merged, "master_det_route", "covid")
+
+
+def _route_open_ended(state: TravelState, ctx2: dict, slots: dict, text_lower: str):
+    if _looks_like_no(text_lower):
+        return _master_reply(state, ctx2, "Alright — have a great trip! ✈️", QKey.OPEN_ENDED)
+    return None
+
+
+# last_question_key -> handler(state, ctx2, slots, text_lower); None falls through to the LLM
+_DET_ROUTES = {
+    QKey.AFTER_FLIGHT_NEXT_STEP: _route_after_flight,
+    QKey.ASK_CABS_AFTER_HOTELS: _route_cabs_after_hotels,
+    QKey.ASK_HOTEL_AFTER_COVID: _route_hotel_after_covid,
+    QKey.ASK_COVID_COUNTRY: _route_covid_country,
+    QKey.OPEN_ENDED: _route_open_ended,
+}
+
+
+# ---------------------------
+# Planner memo
+# ---------------------------
+# Retries, duplicate deliveries and repeated "ok"s hit the planner with the
+# same inputs; reuse the plan instead of another LLM round trip.
+_PLAN_CACHE_MAX = 512
+_PLAN_CACHE_TTL_SEC = 300
+_PLAN_CACHE: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_PLAN_CACHE_LOCK = threading.Lock()
+# relative dates resolve differently over time -> never serve them from cache
+_RELATIVE_DATE_RE = re.compile(r"\b(today|tonight|tomorrow|yesterday|next|this|coming|weekend)\b")
+
+
+def _plan_fingerprint(text_lower: str, state: dict) -> str:
+    raw = json.dumps(
+        {
+            "user": text_lower,
+            "slots": state["slots"],
+            "results": sorted(state["results"]),
+            "history": list(state["history"])[-4:],
+            "last_q": state["last_question_key"],
+            "last_reply": state["last_reply"],
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def _cached_plan(user_text: str, text_lower: str, state: dict) -> dict:
+    if _RELATIVE_DATE_RE.search(text_lower):
+        return plan_next_step(user_input=user_text, state=state, text_lower=text_lower)
+
+    key = _plan_fingerprint(text_lower, state)
+    now = time.monotonic()
+    with _PLAN_CACHE_LOCK:
+        hit = _PLAN_CACHE.get(key)
+        if hit and hit[0] > now:
+            _PLAN_CACHE.move_to_end(key)
+            return dict(hit[1])
+
+    plan = plan_next_step(user_input=user_text, state=state, text_lower=text_lower)
+
+    with _PLAN_CACHE_LOCK:
+        _PLAN_CACHE[key] = (now + _PLAN_CACHE_TTL_SEC, plan)
+        _PLAN_CACHE.move_to_end(key)
+        if len(_PLAN_CACHE) > _PLAN_CACHE_MAX:
+            _PLAN_CACHE.popitem(last=False)
+    return dict(plan)
+
+
 # ---------------------------
 # LLM Master Node
 # ---------------------------
 def node_master_llm(state: TravelState) -> TravelState:
     user_text = (state.get("user_input") or "").strip()
+    # normalized once; matchers, the plan cache and the planner all reuse it
+    text_lower = user_text.lower()
     ctx = state.get("convo_context", {}) or {}
 
     # Load memory
     slots = ctx.get("slots") or {}
-    results = ctx.get("results") or {}
-    history = ctx.get("history") or []
+    results = ctx.get("results_summary") or {}
+    # prior turns only (copied before this turn's append): stable prompt prefix
+    history = list(ctx.get("history") or [])
+    history_seq = ctx.get("history_seq", len(history))
     last_q = ctx.get("last_question_key")
     last_reply = ctx.get("last_reply")
 
-    # Record user msg
+    # Record user msg (the one context copy per turn; see _node_ctx)
     ctx2 = dict(ctx)
     _ctx_history_append(ctx2, "user", user_text)
 
-    # ✅ Deterministic routing for the "Hotel or COVID?" follow-up
-    # This avoids LLM guessing and ensures smooth flow.
-    if last_q == "AFTER_FLIGHT_NEXT_STEP":
-        # start from memory slots
-        merged = dict(slots)
-
-        if _wants_covid(user_text):
-            # ensure country is filled from amadeus (if not already)
-            state["slots"] = merged
-            _resolve_country_from_destination(state)
-            merged = state.get("slots") or merged
-
-            state["llm_action"] = "covid"
-            state["llm_missing"] = []
-            state["slots"] = merged
-            add_trace(state, "master_after_flight_route", {"choice": "covid", "slots": merged})
-            add_trace(state, "master_slots_seen", {"slots": ctx.get("slots")})
-
-            return _persist_context(state, ctx2)
-
-        if _wants_hotel(user_text):
-            state["llm_action"] = "hotels"
-            state["llm_missing"] = []
-            # seed hotel slots from flight info
-            merged.setdefault("city", merged.get("destination"))
-            merged.setdefault("checkin", merged.get("date"))
-            state["slots"] = merged
-            add_trace(state, "master_after_flight_route", {"choice": "hotels", "slots": merged})
-            return _persist_context(state, ctx2)
-
-        if _looks_like_no(user_text):
-            q = "Okay 👍 Anything else you’d like to search (flights/hotels/cabs/covid)?"
-            state["reply"] = q
-            state["next_question"] = q
-            _ctx_history_append(ctx2, "assistant", q)
-            ctx2["last_reply"] = q
-            ctx2["last_question_key"] = "OPEN_ENDED"
-            return _persist_context(state, ctx2)
-
-        # If unclear
-        q = "Please reply with: hotel / covid / or no."
-        state["reply"] = q
-        state["next_question"] = q
-        _ctx_history_append(ctx2, "assistant", q)
-        ctx2["last_reply"] = q
-        ctx2["last_question_key"] = "AFTER_FLIGHT_NEXT_STEP"
-        return _persist_context(state, ctx2)
+    # ✅ Deterministic routing for follow-ups whose answer maps without the LLM
+    handler = _DET_ROUTES.get(last_q)
+    if handler:
+        routed = handler(state, ctx2, slots, text_lower)
+        if routed is not None:
+            return routed
 
     # ✅ Normal path: use LLM planner
-    plan = plan_next_step(
-        user_input=user_text,
-        state={
+    plan = _cached_plan(
+        user_text,
+        text_lower,
+        {
             "slots": slots,
             "results": results,
             "history": history,
+            "history_seq": history_seq,
             "last_reply": last_reply,
-            "last_question": last_q,
+            "last_question_key": last_q,
         }
     )
 
     state["llm_action"] = plan["action"]
+    state["llm_actions"] = plan.get("actions") or []
     state["llm_missing"] = plan.get("missing", []) or []
 
     # merge existing slots with new slots from LLM (so we keep memory)
-    new_slots = dict(slots)
-    new_slots.update(plan.get("slots") or {})
-    state["slots"] = new_slots
+    merged = _mutate_slots(state, slots, **(plan.get("slots") or {}))
+    if plan["action"] == "flights" and _HOTEL_HINT_RE.search(text_lower):
+        _prefetch_hotels(merged)
 
     add_trace(state, "llm_plan", plan)
 
@@ -222,38 +572,191 @@ def node_master_llm(state: TravelState) -> TravelState:
         state["next_question"] = q
         _ctx_history_append(ctx2, "assistant", q)
         ctx2["last_reply"] = q
-        ctx2["last_question_key"] = "ASK_USER"
+        ctx2["last_question_key"] = QKey.ASK_USER
         return _persist_context(state, ctx2)
 
     return _persist_context(state, ctx2)
 
 
 def node_route(state: TravelState) -> str:
-    return state.get("llm_action", "ask_user")
+    action = state.get("llm_action", "ask_user")
+    return action if action in _ROUTE_NODES else "ask_user"
+
+
+# Success replies: static text lives here once; nodes only fill the fields.
+# next_question strings are interned since every turn stores one of them.
+_Q_AFTER_FLIGHT = sys.intern("Hotel or COVID updates?")
+_Q_CABS_AFTER_HOTELS = sys.intern("Do you want to arrange transport from airport to hotel?")
+_Q_ANYTHING_ELSE = sys.intern("Anything else you want to add (flights/hotels/cabs/covid)?")
+_Q_HOTEL_AFTER_COVID = sys.intern("Do you want to book a hotel as well? (Yes/No)")
+
+_FLIGHTS_OK_TMPL = (
+    "Here are flights from {origin} to {destination} on {date} (cheapest first).\n"
+    "Cheapest: {airline} {flight_no} ₹{price_inr} ({depart} → {arrive}).\n\n"
+    "What would you like next?\n"
+    "1) Book a hotel\n"
+    "2) See COVID updates for your destination country\n"
+    "3) Both\n"
+    "4) Everything (hotel + COVID + airport transfer)\n\n"
+    "Reply with: hotel / covid / both / all / or no"
+)
+_HOTELS_OK_TMPL = (
+    "Here are hotels in {city} from {checkin} to {checkout} (cheapest first).\n"
+    "Cheapest: {name} {price_txt}{rating_txt}.\n\n"
+    + _Q_CABS_AFTER_HOTELS
+)
+# (has per-night price, has total price) -> price text, built in one format call
+_HOTEL_PRICE_TMPL = {
+    (True, True): "₹{per_night}/night (₹{total} total)",
+    (True, False): "₹{per_night}/night",
+    (False, True): "₹{total} total",
+    (False, False): "Price unavailable",
+}
+_CABS_OK_TMPL = (
+    "Transfer options from {pickup} to {dropoff} (cheapest first).\n"
+    "Cheapest: {vendor} {type} ₹{fare_inr}.\n\n"
+    + _Q_ANYTHING_ELSE
+)
+_COVID_OK_TMPL = (
+    "COVID update for {location}.\n"
+    "Total cases: {cases} | Total deaths: {deaths} | Active: {active}\n"
+    "Today: +{today_cases} cases, +{today_deaths} deaths.\n\n"
+    + _Q_HOTEL_AFTER_COVID
+)
+
+# required slots per tool node (ordered: drives the "I still need" message)
+_FLIGHTS_REQ = ("origin", "destination", "date")
+_HOTELS_REQ = ("city", "checkin", "checkout")
+_CABS_REQ = ("pickup", "dropoff")
+
+
+# missing slots (in *_REQ order) -> the one question to ask first
+_Q_HOTEL_CITY = "Which city would you like to book the hotel in?"
+_Q_HOTEL_CHECKIN = "What is your check-in date?"
+_HOTELS_MISSING_Q = {
+    ("city",): _Q_HOTEL_CITY,
+    ("city", "checkin"): _Q_HOTEL_CITY,
+    ("city", "checkout"): _Q_HOTEL_CITY,
+    ("city", "checkin", "checkout"): _Q_HOTEL_CITY,
+    ("checkin",): _Q_HOTEL_CHECKIN,
+    ("checkin", "checkout"): _Q_HOTEL_CHECKIN,
+    ("checkout",): "Please enter last day of your stay (check-out date).",
+}
+_Q_CAB_PICKUP = "Where should the cab pick you up from? (Example: 'Mumbai Airport' or 'BOM')"
+_CABS_MISSING_Q = {
+    ("pickup",): _Q_CAB_PICKUP,
+    ("pickup", "dropoff"): _Q_CAB_PICKUP,
+    ("dropoff",): "Which hotel/area/address is your drop-off? (Example: 'Courtyard Mumbai Airport' or 'BOM' or full address)",
+}
+
+
+def _missing(slots: dict, required: tuple) -> tuple:
+    # common case: everything present -> shared empty tuple, nothing built
+    if all(slots.get(k) for k in required):
+        return ()
+    return tuple([k for k in required if not slots.get(k)])
+
+
+# ---------------------------
+# Tool result cache
+# ---------------------------
+# Identical searches within a few minutes (the "yes, and a hotel too" turn
+# re-entering a node with unchanged slots) reuse the provider response.
+# Stand-in for LangGraph's node CachePolicy, which needs langgraph>=0.6.
+_TOOL_CACHE_TTL_SEC = 600
+_TOOL_CACHE_MAX = 256
+_TOOL_CACHE: "OrderedDict[tuple, tuple[float, dict]]" = OrderedDict()
+_TOOL_CACHE_LOCK = threading.Lock()
+
+
+_TOOL_INFLIGHT: "dict[tuple, Future]" = {}
+# a caller joining someone else's in-flight call gives up after this long
+_TOOL_WAIT_TIMEOUT_SEC = 60
+
+
+def _cached_tool(tool: str, key: tuple, fetch) -> dict:
+    """
+    Memoize a successful tool call by (tool, *slot values it reads).
+    Concurrent calls for the same key (e.g. a speculative prefetch and the
+    node itself) share one request. Errors are not cached, so they are
+    retried on the next turn.
+    """
+    k = (tool, *(str(x).strip().lower() for x in key))
+    now = time.monotonic()
+    with _TOOL_CACHE_LOCK:
+        hit = _TOOL_CACHE.get(k)
+        if hit and hit[0] > now:
+            _TOOL_CACHE.move_to_end(k)
+            return hit[1]
+        fut = _TOOL_INFLIGHT.get(k)
+        owner = fut is None
+        if owner:
+            fut = _TOOL_INFLIGHT[k] = Future()
+
+    if not owner:
+        return fut.result(timeout=_TOOL_WAIT_TIMEOUT_SEC)
+
+    # whatever happens to the owner (incl. BaseException), the in-flight entry
+    # is cleared and its future resolved, so joiners never wait on a dead call
+    try:
+        data = fetch()
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    else:
+        with _TOOL_CACHE_LOCK:
+            _TOOL_CACHE[k] = (now + _TOOL_CACHE_TTL_SEC, data)
+            _TOOL_CACHE.move_to_end(k)
+            if len(_TOOL_CACHE) > _TOOL_CACHE_MAX:
+                _TOOL_CACHE.popitem(last=False)
+        fut.set_result(data)
+    finally:
+        with _TOOL_CACHE_LOCK:
+            if _TOOL_INFLIGHT.get(k) is fut:
+                del _TOOL_INFLIGHT[k]
+    return data
+
+
+def _search_hotels(city: str, checkin: str, checkout: str) -> dict:
+    return _cached_tool(
+        "hotels", (city, checkin, checkout),
+        lambda: run_hotels_agent(hotels_provider(), city, checkin, checkout),
+    )
+
+
+_HOTEL_HINT_RE = re.compile(r"hotel|stay|accommod")
+
+
+def _prefetch_hotels(slots: dict) -> None:
+    """
+    Speculative hotel search while flights run, for "flight and hotel" style
+    requests. The result only lands in the tool cache, where node_hotels
+    picks it up if the user goes on to ask; otherwise it just expires.
+    """
+    city = slots.get("city") or slots.get("destination")
+    checkin = slots.get("checkin") or slots.get("date")
+    checkout = slots.get("checkout")
+    if city and checkin and checkout:
+        _PREFETCH_POOL.submit(_search_hotels, city, checkin, checkout)
 
 
 # ---------------------------
 # Tool Nodes
 # ---------------------------
 def node_flights(state: TravelState) -> TravelState:
-    s = state.get("slots", {}) or {}
-    ctx = state.get("updated_context") or state.get("convo_context") or {}
+    s = _slots(state)
+    ctx = _node_ctx(state)
 
-    required = ["origin", "destination", "date"]
-    missing = [k for k in required if not s.get(k)]
+    missing = _missing(s, _FLIGHTS_REQ)
     if missing:
         q = f"I can search flights, but I still need: {', '.join(missing)}."
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "flights_missing", {"missing": missing})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
-
-    from app.agents.flights import run_flights_agent
+        return _reply(state, ctx, q, "flights_missing", {"missing": missing}, question_key=QKey.ASK_USER)
 
     try:
-        data = run_flights_agent(flights_provider, s["origin"], s["destination"], s["date"])
+        data = _cached_tool(
+            "flights", (s["origin"], s["destination"], s["date"]),
+            lambda: run_flights_agent(flights_provider(), s["origin"], s["destination"], s["date"]),
+        )
     except FlightsUnknownLocationError as e:
         if getattr(e, "suggestions", None):
             opts = "\n".join(
@@ -272,21 +775,14 @@ def node_flights(state: TravelState) -> TravelState:
                 f"I couldn’t find a matching {e.field} for “{e.query}”. "
                 "Please tell me a nearby major airport/city (e.g., ‘near Surat’, ‘near Pune’)."
             )
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "flights_unknown_location", {"field": e.field, "query": e.query})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        return _reply(
+            state, ctx, q, "flights_unknown_location", {"field": e.field, "query": e.query},
+            question_key=QKey.ASK_USER,
+        )
 
     except Exception as e:
         q = f"Flight search failed: {str(e)}. Try a different date/city."
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "flights_error", {"error": str(e)})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        return _reply(state, ctx, q, "flights_error", {"error": str(e)})
 
     state.setdefault("results", {})
     state["results"]["flights"] = data
@@ -294,89 +790,49 @@ def node_flights(state: TravelState) -> TravelState:
     cheapest = data.get("cheapest")
     if not cheapest:
         q = f"No flights found for {s['origin']} → {s['destination']} on {s['date']}. Try another date?"
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "flights_none", {})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        return _reply(state, ctx, q, "flights_none", {})
 
     # ✅ IMPORTANT: Fill country info from Amadeus destination
     # ✅ IMPORTANT: Fill country info from Amadeus destination
     _resolve_country_from_destination(state)
 
     # refresh slots after mutation
-    s = state.get("slots", {}) or {}
-
-    reply = (
-        f"Here are flights from {s['origin']} to {s['destination']} on {s['date']} (cheapest first).\n"
-        f"Cheapest: {cheapest.get('airline')} {cheapest.get('flight_no')} ₹{cheapest.get('price_inr')} "
-        f"({cheapest.get('depart')} → {cheapest.get('arrive')}).\n\n"
-        "What would you like next?\n"
-        "1) Book a hotel\n"
-        "2) See COVID updates for your destination country\n\n"
-        "Reply with: hotel / covid / or no"
-    )
-
-    state["reply"] = reply
-    state["next_question"] = "Hotel or COVID updates?"
-    add_trace(state, "flights_ok", {"cheapest": cheapest, "slots": s})
+    s = _slots(state)
 
-    ctx2 = dict(ctx)
-    _ctx_history_append(ctx2, "assistant", reply)
-    ctx2["last_reply"] = reply
-    ctx2["last_question_key"] = "AFTER_FLIGHT_NEXT_STEP"
-    ctx2["slots"] = s
+    reply = _FLIGHTS_OK_TMPL.format(
+        origin=s["origin"], destination=s["destination"], date=s["date"],
+        airline=cheapest.get("airline"), flight_no=cheapest.get("flight_no"), price_inr=cheapest.get("price_inr"),
+        depart=cheapest.get("depart"), arrive=cheapest.get("arrive"),
+    )
 
-    return _persist_context(state, ctx2)
+    return _reply(
+        state, ctx, reply, "flights_ok", {"cheapest": cheapest, "slots": s},
+        next_q=_Q_AFTER_FLIGHT, question_key=QKey.AFTER_FLIGHT_NEXT_STEP,
+    )
 
 
 
 def node_hotels(state: TravelState) -> TravelState:
-    s = state.get("slots", {}) or {}
-    ctx = state.get("updated_context") or state.get("convo_context") or {}
+    s = _slots(state)
+    ctx = _node_ctx(state)
 
-    required = ["city", "checkin", "checkout"]
-    missing = [k for k in required if not s.get(k)]
+    missing = _missing(s, _HOTELS_REQ)
     if missing:
-        if "checkout" in missing and s.get("city") and s.get("checkin"):
-            q = "Please enter last day of your stay (check-out date)."
-        elif "checkin" in missing and s.get("city"):
-            q = "What is your check-in date?"
-        elif "city" in missing:
-            q = "Which city would you like to book the hotel in?"
-        else:
-            q = f"I need: {', '.join(missing)} to search hotels."
-
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "hotels_missing", {"missing": missing})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        q = _HOTELS_MISSING_Q.get(missing) or f"I need: {', '.join(missing)} to search hotels."
+        return _reply(state, ctx, q, "hotels_missing", {"missing": missing}, question_key=QKey.ASK_USER)
 
     try:
-        data = run_hotels_agent(hotels_provider, s["city"], s["checkin"], s["checkout"])
+        data = _search_hotels(s["city"], s["checkin"], s["checkout"])
     except HotelsUnknownLocationError as e:
         q = (
             f"I couldn’t find the city “{e.query}”. "
             "Please confirm the city and country/state (e.g., ‘Springfield, IL, USA’)."
         )
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "hotels_unknown_city", {"query": e.query})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        return _reply(state, ctx, q, "hotels_unknown_city", {"query": e.query}, question_key=QKey.ASK_USER)
 
     except Exception as e:
         q = f"Hotel search failed: {str(e)}. Try another city or dates."
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "hotels_error", {"error": str(e)})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        return _reply(state, ctx, q, "hotels_error", {"error": str(e)})
 
     state.setdefault("results", {})
     state["results"]["hotels"] = data
@@ -384,12 +840,7 @@ def node_hotels(state: TravelState) -> TravelState:
     cheapest = data.get("cheapest")
     if not cheapest:
         q = f"No hotels found in {s['city']} for {s['checkin']} → {s['checkout']}. Try different dates?"
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "hotels_none", {})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        return _reply(state, ctx, q, "hotels_none", {})
 
     name = cheapest.get("name", "Unknown Hotel")
     per_night = cheapest.get("price_per_night_inr")
@@ -397,50 +848,34 @@ def node_hotels(state: TravelState) -> TravelState:
     rating = cheapest.get("rating")
 
     rating_txt = f" (⭐ {rating})" if rating else ""
-    if per_night is not None:
-        price_txt = f"₹{per_night}/night" + (f" (₹{total} total)" if total is not None else "")
-    elif total is not None:
-        price_txt = f"₹{total} total"
-    else:
-        price_txt = "Price unavailable"
-
-    reply = (
-        f"Here are hotels in {s['city']} from {s['checkin']} to {s['checkout']} (cheapest first).\n"
-        f"Cheapest: {name} {price_txt}{rating_txt}.\n\n"
-        "Do you want to arrange transport from airport to hotel?"
+    price_txt = _HOTEL_PRICE_TMPL[per_night is not None, total is not None].format(
+        per_night=per_night, total=total,
     )
-    state["reply"] = reply
-    state["next_question"] = "Do you want to arrange transport from airport to hotel?"
-    add_trace(state, "hotels_ok", {"cheapest": cheapest})
 
-    _ctx_history_append(ctx, "assistant", reply)
-    ctx["last_reply"] = reply
-    ctx["last_question_key"] = "ASK_CABS_AFTER_HOTELS"
-    return _persist_context(state, ctx)
+    reply = _HOTELS_OK_TMPL.format(
+        city=s["city"], checkin=s["checkin"], checkout=s["checkout"],
+        name=name, price_txt=price_txt, rating_txt=rating_txt,
+    )
+    return _reply(
+        state, ctx, reply, "hotels_ok", {"cheapest": cheapest},
+        next_q=_Q_CABS_AFTER_HOTELS, question_key=QKey.ASK_CABS_AFTER_HOTELS,
+    )
 
 
 def node_cabs(state: TravelState) -> TravelState:
-    s = state.get("slots", {}) or {}
-    ctx = state.get("updated_context") or state.get("convo_context") or {}
+    s = _slots(state)
+    ctx = _node_ctx(state)
 
-    required = ["pickup", "dropoff"]
-    missing = [k for k in required if not s.get(k)]
+    missing = _missing(s, _CABS_REQ)
     if missing:
-        if "dropoff" in missing and s.get("pickup"):
-            q = "Which hotel/area/address is your drop-off? (Example: 'Courtyard Mumbai Airport' or 'BOM' or full address)"
-        elif "pickup" in missing:
-            q = "Where should the cab pick you up from? (Example: 'Mumbai Airport' or 'BOM')"
-        else:
-            q = f"I need: {', '.join(missing)} to search transfers."
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "cabs_missing", {"missing": missing})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        q = _CABS_MISSING_Q.get(missing) or f"I need: {', '.join(missing)} to search transfers."
+        return _reply(state, ctx, q, "cabs_missing", {"missing": missing}, question_key=QKey.ASK_USER)
 
     try:
-        data = run_cabs_agent(cabs_provider, s["pickup"], s["dropoff"])
+        data = _cached_tool(
+            "cabs", (s["pickup"], s["dropoff"]),
+            lambda: run_cabs_agent(cabs_provider(), s["pickup"], s["dropoff"]),
+        )
     except CabsUnknownLocationError as e:
         if e.field == "pickup":
             q = (
@@ -454,21 +889,14 @@ def node_cabs(state: TravelState) -> TravelState:
                 "Reply with a hotel/area/airport/city (e.g., 'Taj Lands End' / 'BOM') or a full drop-off address.\n\n"
                 "What should be your exact drop-off?"
             )
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "cabs_unknown_location", {"field": e.field, "query": e.query})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        return _reply(
+            state, ctx, q, "cabs_unknown_location", {"field": e.field, "query": e.query},
+            question_key=QKey.ASK_USER,
+        )
 
     except Exception as e:
         q = f"Transfer search failed: {str(e)}"
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "cabs_error", {"error": str(e)})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        return _reply(state, ctx, q, "cabs_error", {"error": str(e)})
 
     state.setdefault("results", {})
     state["results"]["cabs"] = data
@@ -476,31 +904,21 @@ def node_cabs(state: TravelState) -> TravelState:
     cheapest = data.get("cheapest")
     if not cheapest:
         q = f"No transfers found for {s['pickup']} → {s['dropoff']}. Try changing pickup/dropoff?"
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "cabs_none", {})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
-
-    reply = (
-        f"Transfer options from {s['pickup']} to {s['dropoff']} (cheapest first).\n"
-        f"Cheapest: {cheapest.get('vendor')} {cheapest.get('type')} ₹{cheapest.get('fare_inr')}.\n\n"
-        "Anything else you want to add (flights/hotels/cabs/covid)?"
-    )
-    state["reply"] = reply
-    state["next_question"] = "Anything else you want to add?"
-    add_trace(state, "cabs_ok", {"cheapest": cheapest})
+        return _reply(state, ctx, q, "cabs_none", {})
 
-    _ctx_history_append(ctx, "assistant", reply)
-    ctx["last_reply"] = reply
-    ctx["last_question_key"] = "OPEN_ENDED"
-    return _persist_context(state, ctx)
+    reply = _CABS_OK_TMPL.format(
+        pickup=s["pickup"], dropoff=s["dropoff"],
+        vendor=cheapest.get("vendor"), type=cheapest.get("type"), fare_inr=cheapest.get("fare_inr"),
+    )
+    return _reply(
+        state, ctx, reply, "cabs_ok", {"cheapest": cheapest},
+        next_q=_Q_ANYTHING_ELSE, question_key=QKey.OPEN_ENDED,
+    )
 
 
 def node_covid(state: TravelState) -> TravelState:
-    s = state.get("slots", {}) or {}
-    ctx = state.get("updated_context") or state.get("convo_context") or {}
+    s = _slots(state)
+    ctx = _node_ctx(state)
 
     # ✅ Prefer country filled from flights (Amadeus-derived)
     country = s.get("country") or s.get("destination_country")
@@ -508,76 +926,242 @@ def node_covid(state: TravelState) -> TravelState:
     # If still missing, try to fill again from destination (Amadeus)
     if not country:
         _resolve_country_from_destination(state)
-        s = state.get("slots", {}) or {}
+        s = _slots(state)
         country = s.get("country") or s.get("destination_country")
 
     if not country:
         q = "I couldn’t infer the destination country from your flight destination. Please tell me the country name for COVID updates."
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "covid_missing_country", {"slots": s})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        ctx["last_question_key"] = "ASK_COVID_COUNTRY"
-        return _persist_context(state, ctx)
+        return _reply(state, ctx, q, "covid_missing_country", {"slots": s}, question_key=QKey.ASK_COVID_COUNTRY)
 
+    _await_covid_prefetch(country)
     try:
-        data = run_covid_agent(covid_provider, country)
+        data = run_covid_agent(covid_provider(), country)
     except Exception as e:
         q = f"Sorry — I couldn’t fetch COVID updates for {country}. ({str(e)})"
-        state["reply"] = q
-        state["next_question"] = q
-        add_trace(state, "covid_error", {"country": country, "error": str(e)})
-        _ctx_history_append(ctx, "assistant", q)
-        ctx["last_reply"] = q
-        return _persist_context(state, ctx)
+        return _reply(state, ctx, q, "covid_error", {"country": country, "error": str(e)})
 
     state.setdefault("results", {})
     state["results"]["covid"] = data
 
     totals = data.get("totals") or {}
-    reply = (
-        f"COVID update for {data.get('location') or country}.\n"
-        f"Total cases: {totals.get('cases')} | Total deaths: {totals.get('deaths')} | Active: {totals.get('active')}\n"
-        f"Today: +{totals.get('todayCases')} cases, +{totals.get('todayDeaths')} deaths.\n\n"
-        "Do you want to book a hotel as well? (Yes/No)"
+    reply = _COVID_OK_TMPL.format(
+        location=data.get("location") or country,
+        cases=totals.get("cases"), deaths=totals.get("deaths"), active=totals.get("active"),
+        today_cases=totals.get("todayCases"), today_deaths=totals.get("todayDeaths"),
     )
 
-    state["reply"] = reply
-    state["next_question"] = "Do you want to book a hotel as well? (Yes/No)"
-    add_trace(state, "covid_ok", {"country": country})
+    return _reply(
+        state, ctx, reply, "covid_ok", {"country": country},
+        next_q=_Q_HOTEL_AFTER_COVID, question_key=QKey.ASK_HOTEL_AFTER_COVID,
+    )
 
-    _ctx_history_append(ctx, "assistant", reply)
-    ctx["last_reply"] = reply
-    ctx["last_question_key"] = "ASK_HOTEL_AFTER_COVID"
-    return _persist_context(state, ctx)
+
+# ---------------------------
+# Parallel fan-out
+# ---------------------------
+def _branch_snapshot(state: TravelState) -> TravelState:
+    """
+    Private copy of the mutable parts of state for one parallel branch,
+    so sibling nodes never write into the same slots/results/history objects.
+    """
+    ctx = dict(_node_ctx(state))
+    ctx["history"] = deque(ctx.get("history") or (), maxlen=_HISTORY_MAX)
+
+    branch = dict(state)
+    branch["slots"] = _slots(state)  # copy-on-write via _mutate_slots
+    branch["results"] = dict(state.get("results") or {})
+    branch["trace"] = deque(maxlen=_TRACE_MAX)
+    branch["updated_context"] = ctx
+    return branch
+
+
+# follow-up keys that ask the user for a missing value; one of these must be answered first
+_SLOT_QUESTION_KEYS = frozenset({QKey.ASK_USER, QKey.ASK_COVID_COUNTRY})
+# follow-up key -> action that follow-up offers
+_FOLLOWUP_ACTION = {
+    QKey.ASK_HOTEL_AFTER_COVID: "hotels",
+    QKey.ASK_CABS_AFTER_HOTELS: "cabs",
+}
+
+
+def _run_inline(fn, arg) -> Future:
+    fut = Future()
+    try:
+        fut.set_result(fn(arg))
+    except Exception as e:
+        fut.set_exception(e)
+    return fut
+
+
+def _run_fanout(state: TravelState, actions: list, speculative: tuple = ()) -> TravelState:
+    """
+    Run several tool nodes concurrently on snapshots of state, then merge
+    results/slots/trace and join the replies into one assistant turn.
+    A branch in `speculative` only contributes a reply if it produced results.
+    The merged turn asks one follow-up: a branch's missing-slot question if
+    any, else the last follow-up offering something this fan-out didn't run,
+    else the open-ended "anything else?".
+    """
+    ctx = _node_ctx(state)
+    actions = [a for a in actions if a in _FANOUT_NODES]
+
+    snapshots = [_branch_snapshot(state) for _ in actions]
+    futures = [(a, _FANOUT_POOL.submit(_FANOUT_NODES[a], snap)) for a, snap in zip(actions[1:], snapshots[1:])]
+    if actions:
+        # the first branch runs here, so a fan-out never waits for a pool worker for all of them
+        futures.insert(0, (actions[0], _run_inline(_FANOUT_NODES[actions[0]], snapshots[0])))
+
+    slots = dict(_slots(state))
+    state.setdefault("results", {})
+    branches = []  # (reply, next_question, last_question_key) per branch that replied
+
+    for action, fut in futures:
+        # like gather(return_exceptions=True): one failed branch doesn't sink the rest
+        try:
+            out = fut.result()
+        except Exception as e:
+            add_trace(state, "fanout_error", {"action": action, "error": str(e)})
+            continue
+
+        _trace(state).extend(out.get("trace") or ())
+        if action in speculative and action not in (out.get("results") or {}):
+            add_trace(state, "fanout_speculative_dropped", {"action": action})
+            continue
+
+        slots.update(out.get("slots") or {})
+        state["results"].update(out.get("results") or {})
+        if out.get("reply"):
+            key = (out.get("updated_context") or {}).get("last_question_key")
+            branches.append((out["reply"], out.get("next_question"), key))
+
+    chosen = next((b for b in branches if b[2] in _SLOT_QUESTION_KEYS), None)
+    if chosen is None:
+        # error replies carry no follow-up of their own (next_question == reply)
+        offers = [b for b in branches if b[1] and b[1] != b[0] and _FOLLOWUP_ACTION.get(b[2]) not in actions]
+        chosen = offers[-1] if offers else None
+
+    replies = []
+    for b in branches:
+        if b is chosen:
+            continue
+        text, q, _key = b
+        if q and q != text and text.endswith(q):
+            # only the chosen follow-up is asked; the others are dropped
+            text = text[: -len(q)].rstrip()
+        replies.append(text)
+    if chosen is not None:
+        replies.append(chosen[0])  # last, so its question ends the turn
+    else:
+        replies = replies or ["Sorry — I couldn’t complete those searches. Please try again."]
+        # nothing left to offer (all failed / speculative dropped): move on instead
+        # of leaving the inherited follow-up key to catch the next message
+        chosen = (_Q_ANYTHING_ELSE, _Q_ANYTHING_ELSE, QKey.OPEN_ENDED)
+        replies.append(_Q_ANYTHING_ELSE)
+
+    state["slots"] = slots
+    reply = "\n\n".join(replies)
+    next_q, last_key = chosen[1], chosen[2]
+    return _reply(
+        state, ctx, reply, "fanout_done", {"actions": actions},
+        next_q=next_q, question_key=last_key,
+    )
+
+
+def node_fanout(state: TravelState) -> TravelState:
+    return _run_fanout(state, state.get("llm_actions") or [])
+
+
+def node_post_flight_bundle(state: TravelState) -> TravelState:
+    """
+    All-in-one follow-up after flights: covid + hotels + a speculative
+    airport -> city transfer, issued concurrently.
+    """
+    s = _slots(state)
+    dest = s.get("destination")
+    defaults = {"city": dest, "checkin": s.get("date")}
+    if dest:
+        defaults.update(pickup=f"{dest} Airport", dropoff=dest)
+    s = _mutate_slots(state, defaults, **s)
+
+    if not (s.get("country") or s.get("destination_country")):
+        _resolve_country_from_destination(state)
+
+    return _run_fanout(state, ["covid", "hotels", "cabs"], speculative=("cabs",))
+
+
+_FANOUT_NODES = {
+    "flights": node_flights,
+    "hotels": node_hotels,
+    "cabs": node_cabs,
+    "covid": node_covid,
+}
+
+# llm_action -> node master routes to; anything else ends the turn (ask_user)
+_ROUTE_NODES = {
+    **_FANOUT_NODES,
+    "fanout": node_fanout,
+    "flight_bundle": node_post_flight_bundle,
+}
+
+
+def warmup_providers() -> None:
+    """
+    Token fetch + connection setup for every provider, in the background at
+    startup so the first user doesn't pay for it. Failures are ignored; the
+    real request simply does the work instead.
+    """
+    def _quiet(fn):
+        try:
+            fn()
+        except Exception:
+            pass
+
+    for provider in (flights_provider(), hotels_provider(), cabs_provider(), covid_provider()):
+        _PREFETCH_POOL.submit(_quiet, provider.warmup)
 
 
 # ---------------------------
 # Build graph
 # ---------------------------
-def build_graph():
+def _default_checkpointer():
+    """
+    Optional LangGraph checkpointer (GRAPH_CHECKPOINTER=memory).
+    Conversation.context in Postgres stays the durable memory; the checkpointer
+    adds per-thread state snapshots within one process.
+    """
+    kind = (os.getenv("GRAPH_CHECKPOINTER") or "").strip().lower()
+    if kind == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+    return None
+
+
+def build_graph(checkpointer=None):
+    """
+    Compiled graph; the default (checkpointer from env) is compiled once per
+    process and shared. Pass a checkpointer to get a separate compilation.
+    """
+    if checkpointer is None:
+        return _default_graph()
+    return build_graph_uncached(checkpointer)
+
+
+@cache
+def _default_graph():
+    return build_graph_uncached(_default_checkpointer())
+
+
+def build_graph_uncached(checkpointer=None):
     g = StateGraph(TravelState)
 
     g.add_node("master", node_master_llm)
-    g.add_node("flights", node_flights)
-    g.add_node("hotels", node_hotels)
-    g.add_node("cabs", node_cabs)
-    g.add_node("covid", node_covid)
+    for name, node in _ROUTE_NODES.items():
+        g.add_node(name, node)
+        g.add_edge(name, END)
 
     g.set_entry_point("master")
 
-    g.add_conditional_edges("master", node_route, {
-        "flights": "flights",
-        "hotels": "hotels",
-        "cabs": "cabs",
-        "covid": "covid",
-        "ask_user": END,
-    })
-
-    g.add_edge("flights", END)
-    g.add_edge("hotels", END)
-    g.add_edge("cabs", END)
-    g.add_edge("covid", END)
+    # the branch function runs as part of master's own super-step (no extra hop)
+    g.add_conditional_edges("master", node_route, {**{name: name for name in _ROUTE_NODES}, "ask_user": END})
 
-    return g.compile()
+    return g.compile(checkpointer=checkpointer)
@@ -1,5 +1,21 @@
+from enum import Enum
 from typing import TypedDict, Optional, Any
 
+
+class QKey(str, Enum):
+    """
+    Values of context["last_question_key"]: which follow-up the assistant asked.
+    A str mixin, so members equal / hash like the plain strings stored in the
+    DB context and serialize as-is; a typo at a call site is an AttributeError.
+    """
+    AFTER_FLIGHT_NEXT_STEP = "AFTER_FLIGHT_NEXT_STEP"
+    ASK_CABS_AFTER_HOTELS = "ASK_CABS_AFTER_HOTELS"
+    ASK_HOTEL_AFTER_COVID = "ASK_HOTEL_AFTER_COVID"
+    ASK_COVID_COUNTRY = "ASK_COVID_COUNTRY"
+    OPEN_ENDED = "OPEN_ENDED"
+    ASK_USER = "ASK_USER"
+
+
 class TravelState(TypedDict, total=False):
     conversation_id: str
     user_input: str
@@ -8,7 +24,8 @@ class TravelState(TypedDict, total=False):
     convo_context: dict[str, Any]
 
     # LLM plan
-    llm_action: str                 # flights|hotels|cabs|ask_user
+    llm_action: str                 # flights|hotels|cabs|covid|fanout|flight_bundle|ask_user
+    llm_actions: list[str]          # branches to run in parallel when llm_action == "fanout"
     llm_missing: list[str]
     slots: dict[str, Any]           # global working slots (persist across turns)
 
@@ -16,6 +33,9 @@ class TravelState(TypedDict, total=False):
     reply: str
     next_question: Optional[str]
     results: dict[str, Any]
+    # bounded deque while the graph runs. Deliberately last-value (no operator.add
+    # reducer): nodes return the whole state, and parallel branches each trace
+    # into their own snapshot, merged by _run_fanout.
     trace: list[dict]
 
     # memory to write back to DB
@@ -2,13 +2,35 @@
 import os
 import json
 import re
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Any, Dict, Optional
 
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from app.graph.state import QKey
 
 MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
 
+# Prompt layout: [system, *history window, current turn]. The window start only
+# moves every HISTORY_ROTATE_EVERY messages, so the prefix stays byte-identical
+# across turns and the provider's prompt cache keeps hitting.
+HISTORY_WINDOW = 20
+HISTORY_ROTATE_EVERY = 10
+
+# Older turns are compacted (offers -> one line) and, over budget, summarized.
+HISTORY_VERBATIM_TAIL = 6
+HISTORY_TOKEN_BUDGET = 1500
+HISTORY_MSG_MAX_CHARS = 500
+SUMMARY_MODEL = os.getenv("OPENAI_SUMMARY_MODEL") or MODEL
+
+# the only state the planner sees per turn (history goes in as messages);
+# results is the per-kind summary, never raw provider payloads
+_LLM_STATE_KEYS = ("slots", "results", "last_reply", "last_question_key")
+
 
 SYSTEM_PROMPT = """
 You are the Dialogue Manager for an agentic travel planner.
@@ -16,7 +38,7 @@ You are the Dialogue Manager for an agentic travel planner.
 You decide the NEXT best action based on:
 - user_input
 - memory slots
-- memory results
+- memory results (summary per search kind: count + cheapest option)
 - conversation history
 - last_reply
 - last_question_key (if provided)
@@ -28,6 +50,8 @@ Allowed actions:
 - "hotels"
 - "cabs"
 - "covid"
+- "flight_bundle"  (hotels + covid + airport transfer in one go, after flights)
+- "fanout"  (several independent searches in one turn; list them in "actions")
 - "ask_user"
 
 Slots you may produce (when relevant):
@@ -60,11 +84,15 @@ Rules:
    - "covid" -> action "covid"
    - "no" -> action "ask_user" (ask what next)
 4) If user explicitly says "covid" / "cases" / "covid update" -> action "covid".
-5) Keep questions short and actionable.
+   If, after flights, the user wants everything for the trip (hotel + covid + cab) -> action "flight_bundle".
+5) If one message asks for several searches at once (e.g. "flight + hotel + cab") and each has
+   its slots, use action "fanout" with "actions": e.g. ["flights","hotels","cabs"]; they run in parallel.
+6) Keep questions short and actionable.
 
 Output JSON schema:
 {
-  "action": "flights|hotels|cabs|covid|ask_user",
+  "action": "flights|hotels|cabs|covid|flight_bundle|fanout|ask_user",
+  "actions": ["flights","hotels"],  (only when action=fanout)
   "slots": { ... },
   "missing": ["field1","field2"],
   "ask_user": "question string if action=ask_user else null"
@@ -73,124 +101,262 @@ Output JSON schema:
 
 
 def _safe_json_parse(txt: str) -> Dict[str, Any]:
+    # the planner runs in JSON mode, so anything unparseable is a failed call,
+    # not JSON wrapped in prose; fall back to an empty plan (-> ask_user)
     try:
-        return json.loads(txt)
-    except Exception:
-        m = re.search(r"\{.*\}", txt, re.DOTALL)
-        if m:
-            try:
-                return json.loads(m.group(0))
-            except Exception:
-                return {}
+        plan = json.loads(txt)
+    except (TypeError, json.JSONDecodeError):
         return {}
+    return plan if isinstance(plan, dict) else {}
 
 
 def _normalize_text(t: str) -> str:
     return (t or "").strip().lower()
 
 
-def _extract_yes_no(t: str) -> Optional[str]:
+_YES_SET = frozenset({"y", "yes", "yeah", "yep", "sure", "ok", "okay", "haan", "ha", "ji", "please do"})
+_NO_SET = frozenset({"n", "no", "nope", "nah", "not now", "dont", "don't"})
+_YES_RE = re.compile(r"\b(?:yes|yeah|yep|sure|okay|ok)\b")
+_NO_RE = re.compile(r"\b(?:no|nope|nah)\b")
+# hotel wins over covid when both are mentioned, whatever the order
+_CHOICE_RE = re.compile(r"\b(?:(?P<hotels>hotels?)|(?P<covid>covid|cases|case count|corona))\b")
+
+
+def _extract_yes_no(s: str) -> Optional[str]:
     """
-    Returns "yes" / "no" or None.
+    Returns "yes" / "no" or None. `s` is already normalized (_normalize_text).
     """
-    s = _normalize_text(t)
     # common short replies
-    if s in {"y", "yes", "yeah", "yep", "sure", "ok", "okay", "haan", "ha", "ji", "please do"}:
+    if s in _YES_SET:
         return "yes"
-    if s in {"n", "no", "nope", "nah", "not now", "dont", "don't"}:
+    if s in _NO_SET:
         return "no"
     # if sentence contains explicit yes/no intent
-    if re.search(r"\b(yes|yeah|yep|sure|okay|ok)\b", s):
+    if _YES_RE.search(s):
         return "yes"
-    if re.search(r"\b(no|nope|nah)\b", s):
+    if _NO_RE.search(s):
         return "no"
     return None
 
 
-def _extract_choice_hotel_or_covid(t: str) -> Optional[str]:
+def _extract_choice_hotel_or_covid(s: str) -> Optional[str]:
     """
-    Returns "hotels" / "covid" / None.
+    Returns "hotels" / "covid" / None. `s` is already normalized (_normalize_text).
     """
-    s = _normalize_text(t)
-    if re.search(r"\b(hotel|hotels)\b", s):
-        return "hotels"
-    if re.search(r"\b(covid|cases|case count|covid update|covid updates|corona)\b", s):
-        return "covid"
-    return None
+    found = None
+    for m in _CHOICE_RE.finditer(s):
+        if m.lastgroup == "hotels":
+            return "hotels"
+        found = "covid"
+    return found
 
 
 def _has_flights(results: Dict[str, Any]) -> bool:
+    # results is the per-kind summary kept in the conversation context
     flights = (results or {}).get("flights") or {}
-    arr = flights.get("flights") or []
-    return isinstance(arr, list) and len(arr) > 0
+    return (flights.get("count") or 0) > 0
 
 
-_llm = ChatOpenAI(model=MODEL, temperature=0)
+_TOOL_ACTIONS = ("flights", "hotels", "cabs", "covid")
 
 
-def plan_next_step(user_input: str, state: Dict[str, Any]) -> Dict[str, Any]:
+def _normalize_fanout(action: Any, actions: Any) -> tuple[str, list]:
     """
-    Hybrid planner:
-    - deterministic routing for the specific follow-up:
-      "hotel OR covid?" after flights
-    - LLM handles everything else
+    Returns (action, actions). A list action or "fanout" becomes a de-duplicated
+    list of tool actions; fewer than two collapses back to a single action.
     """
-    state = state or {}
-    results = state.get("results") or {}
-    last_reply = state.get("last_reply") or ""
-    last_key = state.get("last_question_key")  # may be None
-    history = state.get("history") or []
+    if isinstance(action, list):
+        actions, action = action, "fanout"
+    if action != "fanout":
+        return action, []
+    picked = list(dict.fromkeys(a for a in (actions or []) if a in _TOOL_ACTIONS))
+    if len(picked) < 2:
+        return (picked[0] if picked else "ask_user"), []
+    return "fanout", picked
+
+
+def _stable_history(history: list, seq: Optional[int]) -> list:
+    """
+    Buffer-then-truncate: keep at most HISTORY_WINDOW messages, starting on a
+    multiple of HISTORY_ROTATE_EVERY in absolute message numbering.
+    `seq` is the total number of messages ever appended (history holds the tail).
+    """
+    history = list(history or [])
+    if seq is None:
+        seq = len(history)
+    first = seq - len(history)  # absolute index of history[0]
+    start = max(0, seq - HISTORY_WINDOW)
+    start = -(-start // HISTORY_ROTATE_EVERY) * HISTORY_ROTATE_EVERY
+    return history[max(0, start - first):]
+
+
+_OFFER_RE = re.compile(r"Cheapest:\s*([^\n]+)")
+
+
+def _approx_tokens(history: list) -> int:
+    return sum(len(m.get("content") or "") for m in history) // 4
+
+
+def _compact_message(m: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Deterministic per message, so an already-compacted prefix stays identical
+    from turn to turn. Offer listings shrink to their "Cheapest:" line.
+    """
+    content = m.get("content") or ""
+    if m.get("role") == "assistant":
+        hit = _OFFER_RE.search(content)
+        if hit:
+            return {"role": "assistant", "content": f"(offered) Cheapest: {hit.group(1).strip()}"}
+    if len(content) > HISTORY_MSG_MAX_CHARS:
+        content = content[:HISTORY_MSG_MAX_CHARS] + "…"
+    return {"role": m.get("role"), "content": content}
+
+
+_SUMMARY_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_SUMMARY_CACHE_MAX = 256
+
+
+def _summarize_block(history: list) -> str:
+    raw = json.dumps(history, ensure_ascii=False, sort_keys=True)
+    key = hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+    hit = _SUMMARY_CACHE.get(key)
+    if hit is not None:
+        return hit
+
+    resp = _llm_mini.invoke([
+        SystemMessage(content=(
+            "Summarize this travel-planning conversation in at most 3 short lines: "
+            "places, dates, what was searched or offered, and what the user decided."
+        )),
+        HumanMessage(content=raw),
+    ])
+    summary = (resp.content or "").strip()
+
+    _SUMMARY_CACHE[key] = summary
+    if len(_SUMMARY_CACHE) > _SUMMARY_CACHE_MAX:
+        _SUMMARY_CACHE.popitem(last=False)
+    return summary
+
+
+def _compress_history(history: list, max_tokens: int = HISTORY_TOKEN_BUDGET) -> list:
+    """
+    Keep the last HISTORY_VERBATIM_TAIL messages verbatim and compact the rest.
+    Still over budget -> the window's first HISTORY_ROTATE_EVERY messages (fixed
+    until the window rotates, so the summary is cached for that whole period)
+    become one summary line.
+    """
+    history = list(history or [])
+    cut = max(0, len(history) - HISTORY_VERBATIM_TAIL)
+    older = [_compact_message(m) for m in history[:cut]]
+    tail = history[cut:]
 
-    txt = user_input or ""
-    yn = _extract_yes_no(txt)
-    choice = _extract_choice_hotel_or_covid(txt)
+    if older and _approx_tokens(older) + _approx_tokens(tail) > max_tokens:
+        block, older = older[:HISTORY_ROTATE_EVERY], older[HISTORY_ROTATE_EVERY:]
+        try:
+            summary = _summarize_block(block)
+        except Exception:
+            summary = ""
+        if summary:
+            older.insert(0, {"role": "assistant", "content": f"(summary of earlier conversation) {summary}"})
+    return older + tail
 
+
+def _history_messages(history: list) -> list:
+    return [
+        AIMessage(content=m.get("content") or "") if m.get("role") == "assistant"
+        else HumanMessage(content=m.get("content") or "")
+        for m in history
+    ]
+
+
+_llm = ChatOpenAI(model=MODEL, temperature=0, model_kwargs={"response_format": {"type": "json_object"}})
+_llm_mini = ChatOpenAI(model=SUMMARY_MODEL, temperature=0)
+
+
+def _route(action: str, ask_user: Optional[str] = None) -> MappingProxyType:
+    return MappingProxyType({"action": action, "slots": {}, "missing": [], "ask_user": ask_user})
+
+
+_ROUTE_COVID = _route("covid")
+_ROUTE_HOTELS = _route("hotels")
+_ASK_NEXT = _route("ask_user", "Okay — what would you like to do next (flights / hotels / cabs / covid)?")
+_ASK_HOTEL_OR_COVID = _route("ask_user", "Do you want to book a hotel or see COVID updates? Reply: hotel / covid / no")
+
+
+@lru_cache(maxsize=1024)
+def _deterministic(last_key: Optional[str], has_flights: bool, s: str) -> Optional[MappingProxyType]:
+    """
+    Read-only plan template for the follow-ups that need no LLM, or None.
+    `s` is the normalized user text; short replies repeat, so results are cached.
+    """
     # 1) Deterministic handling of the "after flights" follow-up (best reliability)
     # Prefer last_question_key if you set it (recommended).
-    if last_key == "AFTER_FLIGHT_NEXT_STEP":
+    if last_key == QKey.AFTER_FLIGHT_NEXT_STEP:
+        choice = _extract_choice_hotel_or_covid(s)
         if choice == "covid":
-            return {"action": "covid", "slots": {}, "missing": [], "ask_user": None}
+            return _ROUTE_COVID
         if choice == "hotels":
-            return {"action": "hotels", "slots": {}, "missing": [], "ask_user": None}
+            return _ROUTE_HOTELS
+        yn = _extract_yes_no(s)
         if yn == "yes":
             # yes defaults to hotel (as per your requirement)
-            return {"action": "hotels", "slots": {}, "missing": [], "ask_user": None}
+            return _ROUTE_HOTELS
         if yn == "no":
-            return {
-                "action": "ask_user",
-                "slots": {},
-                "missing": [],
-                "ask_user": "Okay — what would you like to do next (flights / hotels / cabs / covid)?",
-            }
-
+            return _ASK_NEXT
         # unclear reply, ask again
-        return {
-            "action": "ask_user",
-            "slots": {},
-            "missing": [],
-            "ask_user": "Do you want to book a hotel or see COVID updates? Reply: hotel / covid / no",
-        }
+        return _ASK_HOTEL_OR_COVID
 
     # 2) If flights exist and user asks covid/hotel explicitly, route fast
-    if _has_flights(results) and choice in {"hotels", "covid"}:
-        return {"action": choice, "slots": {}, "missing": [], "ask_user": None}
+    if has_flights:
+        choice = _extract_choice_hotel_or_covid(s)
+        if choice == "covid":
+            return _ROUTE_COVID
+        if choice == "hotels":
+            return _ROUTE_HOTELS
+    return None
+
+
+def plan_next_step(user_input: str, state: Dict[str, Any], text_lower: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Hybrid planner:
+    - deterministic routing for the specific follow-up:
+      "hotel OR covid?" after flights
+    - LLM handles everything else
+    """
+    state = state or {}
+    results = state.get("results") or {}
+    last_reply = state.get("last_reply") or ""
+    last_key = state.get("last_question_key")  # may be None
+    history = state.get("history") or []
+
+    # 1) + 2) deterministic follow-ups, no LLM call
+    if text_lower is None:
+        text_lower = _normalize_text(user_input)
+    cached = _deterministic(last_key, _has_flights(results), text_lower)
+    if cached is not None:
+        return {**cached, "slots": {}, "missing": []}
 
     # 3) Otherwise call LLM for intent + slot extraction
+    # stable prefix (system + prior turns) first, per-turn state as the final delta
+    prior = _history_messages(_compress_history(_stable_history(history, state.get("history_seq"))))
+    turn_state = {k: state.get(k) for k in _LLM_STATE_KEYS}
     msg = HumanMessage(
         content=json.dumps(
-            {"user_input": user_input, "state": state},
+            {"user_input": user_input, "state": turn_state},
             ensure_ascii=False,
+            separators=(",", ":"),
         )
     )
-    resp = _llm.invoke([SystemMessage(content=SYSTEM_PROMPT), msg])
+    resp = _llm.invoke([SystemMessage(content=SYSTEM_PROMPT), *prior, msg])
     plan = _safe_json_parse(resp.content)
 
-    action = plan.get("action") or "ask_user"
-    if action not in {"flights", "hotels", "cabs", "covid", "ask_user"}:
+    action, actions = _normalize_fanout(plan.get("action") or "ask_user", plan.get("actions"))
+    if action not in {"flights", "hotels", "cabs", "covid", "flight_bundle", "fanout", "ask_user"}:
         action = "ask_user"
 
     return {
         "action": action,
+        "actions": actions,
         "slots": plan.get("slots") or {},
         "missing": plan.get("missing") or [],
         "ask_user": plan.get("ask_user"),
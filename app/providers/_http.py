@@ -0,0 +1,74 @@
+from urllib.error import URLError
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _retry() -> Retry:
+    # idempotent methods only (urllib3 default); the last response is returned
+    # instead of raised so the SDK / provider maps the status as before
+    return Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    )
+
+
+def new_session(pool_maxsize: int = 16) -> requests.Session:
+    """
+    requests.Session with a keep-alive connection pool, so warm calls skip
+    the TCP connect + TLS handshake.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=20, pool_maxsize=pool_maxsize, max_retries=_retry())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# One keep-alive pool for every outbound API (Amadeus + disease.sh).
+SESSION = new_session(pool_maxsize=50)
+
+
+class _SessionResponse:
+    """
+    Just enough of urllib's HTTPResponse for the Amadeus SDK parser
+    (status / info() / read()).
+    """
+
+    def __init__(self, resp: requests.Response):
+        self.status = resp.status_code
+        self._resp = resp
+
+    def info(self):
+        return self._resp.headers
+
+    def read(self) -> bytes:
+        return self._resp.content
+
+
+class SessionHTTP:
+    """
+    urlopen-compatible callable for amadeus.Client(http=...).
+    Every SDK call (including the OAuth token fetch) goes through one pooled session.
+    """
+
+    def __init__(self, session: requests.Session, timeout: int = 15):
+        self.session = session
+        self.timeout = timeout
+
+    def __call__(self, http_request) -> _SessionResponse:
+        try:
+            resp = self.session.request(
+                http_request.get_method(),
+                http_request.full_url,
+                data=http_request.data,
+                headers=dict(http_request.header_items()),
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            # SDK maps URLError -> NetworkError
+            raise URLError(str(e))
+        return _SessionResponse(resp)
@@ -0,0 +1,58 @@
+import os
+import threading
+from typing import Optional
+
+from amadeus import Client
+from amadeus.client.access_token import AccessToken
+
+from app.providers._http import SESSION, SessionHTTP
+
+
+class _LockedAccessToken(AccessToken):
+    """
+    SDK token holder with refresh serialized, so concurrent fan-out branches
+    on a cold (or expiring) token issue one OAuth call instead of one each.
+    """
+
+    def __init__(self, client):
+        super().__init__(client)
+        self._lock = threading.Lock()
+
+    def _bearer_token(self):
+        with self._lock:
+            return super()._bearer_token()
+
+
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
+
+
+def shared_client() -> Client:
+    """
+    One amadeus.Client (one OAuth token, one pooled session) shared by the
+    flights / hotels / cabs providers.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = Client(
+                    client_id=os.getenv("AMADEUS_CLIENT_ID"),
+                    client_secret=os.getenv("AMADEUS_CLIENT_SECRET"),
+                    hostname=os.getenv("AMADEUS_HOSTNAME", "test"),
+                    http=SessionHTTP(SESSION),
+                )
+                # the SDK creates this lazily on first request; install ours up front
+                client.access_token = _LockedAccessToken(client)
+                _client = client
+    return _client
+
+
+def warm_up(client: Client) -> None:
+    """
+    Fetch the OAuth token now, which also opens the pooled TLS connection,
+    so the first user request doesn't pay for it.
+    """
+    if not hasattr(client, "access_token"):
+        client.access_token = _LockedAccessToken(client)
+    client.access_token._bearer_token()
@@ -1,10 +1,23 @@
-import os
-from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from operator import itemgetter
+from typing import Iterator, List, Optional
 
 from amadeus import Client, ResponseError, Location
+from app.providers.amadeus_auth import shared_client, warm_up
+from app.providers.amadeus_locations import as_iata, resolve_pair, search_locations
 from app.providers.base import CabsProvider
 
+_BY_FARE = itemgetter("fare_inr")
+
+
+# the value only changes when the UTC day does
+@lru_cache(maxsize=1)
+def _tomorrow_10_utc(today: date) -> str:
+    tmr = today + timedelta(days=1)
+    dt = datetime(tmr.year, tmr.month, tmr.day, 10, 0, tzinfo=timezone.utc)
+    return dt.isoformat().replace("+00:00", "Z")
+
 
 class UnknownLocationError(ValueError):
     def __init__(self, field: str, query: str, suggestions: List[dict]):
@@ -25,13 +38,12 @@ class AmadeusCabsProvider(CabsProvider):
     - For hotel names without address, we may need user to provide an address/area
     """
 
-    def __init__(self):
-        self.client = Client(
-            client_id=os.getenv("AMADEUS_CLIENT_ID"),
-            client_secret=os.getenv("AMADEUS_CLIENT_SECRET"),
-            hostname=os.getenv("AMADEUS_HOSTNAME", "test"),
-        )
-        self._cache: Dict[str, str] = {}
+    def __init__(self, client: Optional[Client] = None):
+        # shared client -> one OAuth token across all Amadeus providers
+        self.client = client or shared_client()
+
+    def warmup(self) -> None:
+        warm_up(self.client)
 
     @staticmethod
     def _norm(s: str) -> str:
@@ -39,15 +51,12 @@ class AmadeusCabsProvider(CabsProvider):
 
     def _search_locations(self, keyword: str, max_items: int = 6) -> List[dict]:
         try:
-            resp = self.client.reference_data.locations.get(
-                keyword=keyword,
-                subType=Location.ANY,  # AIRPORT,CITY
-            )
+            data = search_locations(self.client, keyword, Location.ANY)  # AIRPORT,CITY
         except ResponseError:
             return []
 
         out = []
-        for it in (resp.data or [])[: max_items * 2]:
+        for it in data[: max_items * 2]:
             code = it.get("iataCode")
             if not code:
                 continue
@@ -69,13 +78,11 @@ class AmadeusCabsProvider(CabsProvider):
             raise UnknownLocationError(field, text, [])
 
         # direct IATA
-        if len(raw) == 3 and raw.isalpha():
-            return raw.upper()
+        code = as_iata(raw)
+        if code:
+            return code
 
         key = self._norm(raw)
-        if key in self._cache:
-            return self._cache[key]
-
         candidates = self._search_locations(raw)
         if not candidates and len(raw) >= 3:
             candidates = self._search_locations(raw[:3])
@@ -93,9 +100,7 @@ class AmadeusCabsProvider(CabsProvider):
 
         candidates.sort(key=score, reverse=True)
         best = candidates[0]
-        code = best["iataCode"].upper()
-        self._cache[key] = code
-        return code
+        return best["iataCode"].upper()
 
     @staticmethod
     def _default_start_datetime_iso() -> str:
@@ -103,10 +108,7 @@ class AmadeusCabsProvider(CabsProvider):
         Transfers needs a future date-time. Use tomorrow 10:00 UTC.
         (You can improve later by passing user-selected time.)
         """
-        now = datetime.now(timezone.utc)
-        tmr = (now + timedelta(days=1)).date()
-        dt = datetime(tmr.year, tmr.month, tmr.day, 10, 0, tzinfo=timezone.utc)
-        return dt.isoformat().replace("+00:00", "Z")
+        return _tomorrow_10_utc(datetime.now(timezone.utc).date())
 
     def _parse_offer_price_inr(self, offer: dict) -> Optional[float]:
         """
@@ -114,24 +116,19 @@ class AmadeusCabsProvider(CabsProvider):
         """
         # Common patterns: offer["quotation"]["monetaryAmount"] or offer["quotation"]["base"]["monetaryAmount"]
         q = offer.get("quotation") or {}
-        for path in [
-            ("monetaryAmount",),
-            ("base", "monetaryAmount"),
-            ("total", "monetaryAmount"),
-        ]:
-            cur = q
-            ok = True
-            for k in path:
-                if isinstance(cur, dict) and k in cur:
-                    cur = cur[k]
-                else:
-                    ok = False
-                    break
-            if ok:
-                try:
-                    return float(cur)
-                except Exception:
-                    pass
+        base = q.get("base")
+        total = q.get("total")
+        for amount in (
+            q.get("monetaryAmount"),
+            base.get("monetaryAmount") if isinstance(base, dict) else None,
+            total.get("monetaryAmount") if isinstance(total, dict) else None,
+        ):
+            if amount is None:
+                continue
+            try:
+                return float(amount)
+            except (TypeError, ValueError):
+                pass
         return None
 
     def search_cabs(self, pickup: str, dropoff: str) -> list[dict]:
@@ -139,8 +136,7 @@ class AmadeusCabsProvider(CabsProvider):
         Returns list sorted cheapest first:
         {vendor,type,pickup,dropoff,eta_min,fare_inr}
         """
-        start_code = self._resolve_iata(pickup, "pickup")
-        end_code = self._resolve_iata(dropoff, "dropoff")
+        start_code, end_code = resolve_pair(self._resolve_iata, (pickup, "pickup"), (dropoff, "dropoff"))
 
         body = {
             "startLocationCode": start_code,
@@ -158,9 +154,10 @@ class AmadeusCabsProvider(CabsProvider):
             # Bubble as runtime error; your node can show a friendly message
             raise RuntimeError(str(e))
 
-        offers = resp.data or []
-        out = []
+        # parse lazily and sort once, as the flights provider does
+        return sorted(self._iter_offers(resp.data or [], pickup, dropoff), key=_BY_FARE)
 
+    def _iter_offers(self, offers: list, pickup: str, dropoff: str) -> Iterator[dict]:
         for off in offers:
             price = self._parse_offer_price_inr(off)
             if price is None:
@@ -169,14 +166,11 @@ class AmadeusCabsProvider(CabsProvider):
             vehicle = off.get("vehicle") or {}
             service = off.get("serviceProvider") or {}
 
-            out.append({
+            yield {
                 "vendor": service.get("name") or "Transfer",
                 "type": vehicle.get("code") or vehicle.get("description") or "Car",
                 "pickup": pickup,
                 "dropoff": dropoff,
                 "eta_min": None,
                 "fare_inr": price,
-            })
-
-        out = sorted(out, key=lambda x: x["fare_inr"])
-        return out
+            }
@@ -1,7 +1,10 @@
-import os
-from typing import Dict, List, Optional, Tuple
+import time
+from operator import itemgetter
+from typing import Dict, Iterator, List, Optional, Tuple
 from amadeus import Location, ResponseError
 from amadeus import Client, ResponseError, Location
+from app.providers.amadeus_auth import shared_client, warm_up
+from app.providers.amadeus_locations import as_iata, resolve_pair, search_locations
 from app.providers.base import FlightsProvider
 
 
@@ -13,6 +16,11 @@ class UnknownLocationError(ValueError):
         self.suggestions = suggestions
 
 
+COUNTRY_CACHE_TTL_SEC = 24 * 3600
+
+_BY_PRICE = itemgetter("price_inr")
+
+
 class AmadeusFlightsProvider(FlightsProvider):
     """
     Zero hardcoding:
@@ -24,14 +32,14 @@ class AmadeusFlightsProvider(FlightsProvider):
     :contentReference[oaicite:1]{index=1}
     """
 
-    def __init__(self):
-        self.client = Client(
-            client_id=os.getenv("AMADEUS_CLIENT_ID"),
-            client_secret=os.getenv("AMADEUS_CLIENT_SECRET"),
-            hostname=os.getenv("AMADEUS_HOSTNAME", "test"),
-        )
-        # cache: normalized text -> iata
-        self._cache: Dict[str, str] = {}
+    def __init__(self, client: Optional[Client] = None):
+        # shared client -> one OAuth token across all Amadeus providers
+        self.client = client or shared_client()
+        # cache: normalized text -> (expires_at, location); country mapping rarely changes
+        self._country_cache: Dict[str, Tuple[float, dict]] = {}
+
+    def warmup(self) -> None:
+        warm_up(self.client)
 
     @staticmethod
     def _norm(s: str) -> str:
@@ -42,15 +50,12 @@ class AmadeusFlightsProvider(FlightsProvider):
         Returns list of candidates: [{name, iataCode, subType, countryCode, cityName}]
         """
         try:
-            resp = self.client.reference_data.locations.get(
-                keyword=keyword,
-                subType=Location.ANY,  # AIRPORT,CITY
-            )
+            data = search_locations(self.client, keyword, Location.ANY)  # AIRPORT,CITY
         except ResponseError:
             return []
 
         out = []
-        for it in (resp.data or [])[: max_items * 2]:
+        for it in data[: max_items * 2]:
             code = it.get("iataCode")
             if not code:
                 continue
@@ -85,12 +90,9 @@ class AmadeusFlightsProvider(FlightsProvider):
             raise UnknownLocationError(field, text, [])
 
         # already an IATA code
-        if len(raw) == 3 and raw.isalpha():
-            return raw.upper()
-
-        key = self._norm(raw)
-        if key in self._cache:
-            return self._cache[key]
+        code = as_iata(raw)
+        if code:
+            return code
 
         # Try full keyword, then fallback to first 3 chars (Amadeus autocomplete behaves best on prefixes)
         candidates = self._search_locations(raw)
@@ -101,13 +103,10 @@ class AmadeusFlightsProvider(FlightsProvider):
             raise UnknownLocationError(field, raw, [])
 
         best = candidates[0]
-        code = best["iataCode"].upper()
-        self._cache[key] = code
-        return code
+        return best["iataCode"].upper()
 
     def search_flights(self, origin: str, destination: str, date_iso: str) -> list[dict]:
-        o = self._resolve_to_iata(origin, "origin")
-        d = self._resolve_to_iata(destination, "destination")
+        o, d = resolve_pair(self._resolve_to_iata, (origin, "origin"), (destination, "destination"))
 
         try:
             resp = self.client.shopping.flight_offers_search.get(
@@ -121,8 +120,11 @@ class AmadeusFlightsProvider(FlightsProvider):
         except ResponseError as e:
             raise RuntimeError(str(e))
 
-        offers = resp.data or []
-        out = []
+        # parse lazily and sort once; no intermediate list of parsed offers
+        return sorted(self._iter_offers(resp.data or [], o, d, date_iso), key=_BY_PRICE)
+
+    @staticmethod
+    def _iter_offers(offers: list, o: str, d: str, date_iso: str) -> Iterator[dict]:
         for off in offers:
             price = off.get("price", {}).get("grandTotal")
             itineraries = off.get("itineraries", [])
@@ -135,7 +137,7 @@ class AmadeusFlightsProvider(FlightsProvider):
             if price is None:
                 continue
 
-            out.append({
+            yield {
                 "airline": carrier,
                 "flight_no": f"{carrier}{number}" if carrier and number else None,
                 "origin": o,
@@ -144,9 +146,7 @@ class AmadeusFlightsProvider(FlightsProvider):
                 "depart": depart,
                 "arrive": arrive,
                 "price_inr": float(price),
-            })
-
-        return sorted(out, key=lambda x: x["price_inr"])
+            }
 
 
 
@@ -162,24 +162,28 @@ class AmadeusFlightsProvider(FlightsProvider):
         if not q:
             return {}
 
+        key = self._norm(q)
+        hit = self._country_cache.get(key)
+        if hit and hit[0] > time.monotonic():
+            return hit[1]
+
+        loc = self._lookup_location_country(q)
+        if loc.get("countryCode"):
+            # only cache successful lookups so transient failures are retried
+            self._country_cache[key] = (time.monotonic() + COUNTRY_CACHE_TTL_SEC, loc)
+        return loc
+
+    def _lookup_location_country(self, q: str) -> dict:
         try:
-            resp = self.client.reference_data.locations.get(
-                keyword=q,
-                subType=Location.ANY,  # CITY, AIRPORT
-            )
+            items = search_locations(self.client, q, Location.ANY)  # CITY, AIRPORT
         except ResponseError:
             return {}
 
-        items = resp.data or []
         if not items:
             # fallback: prefix search helps autocomplete
             if len(q) >= 3:
                 try:
-                    resp = self.client.reference_data.locations.get(
-                        keyword=q[:3],
-                        subType=Location.ANY,
-                    )
-                    items = resp.data or []
+                    items = search_locations(self.client, q[:3], Location.ANY)
                 except ResponseError:
                     return {}
             if not items:
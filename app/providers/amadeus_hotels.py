@@ -1,11 +1,22 @@
-import os
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from typing import List, Optional
 
 from amadeus import Client, ResponseError, Location
+from app.providers.amadeus_auth import shared_client, warm_up
+from app.providers.amadeus_locations import as_iata, search_locations
 from app.providers.base import HotelsProvider
 
 from app.providers.amadeus_flights import UnknownLocationError  # reuse same error type
 
+_BY_TOTAL = itemgetter("price_total_inr")
+_FIRST = itemgetter(0)
+
+# hotel offers are asked in chunks (the API slows down on long hotelIds lists)
+HOTEL_IDS_MAX = 45
+OFFERS_CHUNK = 15
+_OFFERS_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="amadeus-hotel-offers")
+
 
 class AmadeusHotelsProvider(HotelsProvider):
     """
@@ -16,29 +27,21 @@ class AmadeusHotelsProvider(HotelsProvider):
     :contentReference[oaicite:2]{index=2}
     """
 
-    def __init__(self):
-        self.client = Client(
-            client_id=os.getenv("AMADEUS_CLIENT_ID"),
-            client_secret=os.getenv("AMADEUS_CLIENT_SECRET"),
-            hostname=os.getenv("AMADEUS_HOSTNAME", "test"),
-        )
-        self._city_cache: Dict[str, str] = {}
+    def __init__(self, client: Optional[Client] = None):
+        # shared client -> one OAuth token across all Amadeus providers
+        self.client = client or shared_client()
 
-    @staticmethod
-    def _norm(s: str) -> str:
-        return (s or "").strip().lower()
+    def warmup(self) -> None:
+        warm_up(self.client)
 
     def _search_cities(self, keyword: str, max_items: int = 6) -> List[dict]:
         try:
-            resp = self.client.reference_data.locations.get(
-                keyword=keyword,
-                subType=Location.CITY,  # only city codes
-            )
+            data = search_locations(self.client, keyword, Location.CITY)  # only city codes
         except ResponseError:
             return []
 
         out = []
-        for it in (resp.data or [])[: max_items * 2]:
+        for it in data[: max_items * 2]:
             code = it.get("iataCode")
             if not code:
                 continue
@@ -57,12 +60,9 @@ class AmadeusHotelsProvider(HotelsProvider):
             raise UnknownLocationError("city", city_text, [])
 
         # allow direct city IATA
-        if len(raw) == 3 and raw.isalpha():
-            return raw.upper()
-
-        key = self._norm(raw)
-        if key in self._city_cache:
-            return self._city_cache[key]
+        code = as_iata(raw)
+        if code:
+            return code
 
         candidates = self._search_cities(raw)
         if not candidates and len(raw) >= 3:
@@ -71,9 +71,7 @@ class AmadeusHotelsProvider(HotelsProvider):
         if not candidates:
             raise UnknownLocationError("city", raw, [])
 
-        code = candidates[0]["iataCode"].upper()
-        self._city_cache[key] = code
-        return code
+        return candidates[0]["iataCode"].upper()
 
     def _get_hotel_ids_by_city(self, city_code: str, limit: int = 15) -> List[str]:
         try:
@@ -84,50 +82,66 @@ class AmadeusHotelsProvider(HotelsProvider):
         ids = [h.get("hotelId") for h in (resp.data or []) if h.get("hotelId")]
         return ids[:limit]
 
+    def _fetch_offers(self, hotel_ids: List[str], adults: int, checkin: str, checkout: str) -> list:
+        """
+        Offers for up to HOTEL_IDS_MAX hotels, asked in OFFERS_CHUNK-sized
+        requests that run concurrently: more price coverage for the latency of
+        one call. A failed chunk is dropped; if every chunk fails, the error
+        is raised as before.
+        """
+        def fetch(ids: List[str]) -> list:
+            resp = self.client.shopping.hotel_offers_search.get(
+                hotelIds=ids,
+                adults=str(adults),
+                checkInDate=checkin,
+                checkOutDate=checkout,
+            )
+            return resp.data or []
+
+        chunks = [hotel_ids[i:i + OFFERS_CHUNK] for i in range(0, len(hotel_ids), OFFERS_CHUNK)]
+        # first chunk runs inline, so a small city never touches the pool
+        futures = [_OFFERS_POOL.submit(fetch, ids) for ids in chunks[1:]]
+        results, failed = [], []
+        try:
+            results.extend(fetch(chunks[0]))
+        except ResponseError as e:
+            failed.append(e)
+        for fut in futures:
+            try:
+                results.extend(fut.result())
+            except ResponseError as e:
+                failed.append(e)
+        if len(failed) == len(chunks):
+            raise RuntimeError(str(failed[0]))
+        return results
+
     def search_hotels(self, city: str, checkin: str, checkout: str, adults: int = 1) -> list[dict]:
         city_code = self._resolve_city_code(city)
 
-        hotel_ids = self._get_hotel_ids_by_city(city_code, limit=15)
+        hotel_ids = self._get_hotel_ids_by_city(city_code, limit=HOTEL_IDS_MAX)
         if not hotel_ids:
             return []
 
-        try:
-            offers = self.client.shopping.hotel_offers_search.get(
-                hotelIds=hotel_ids,
-                adults=str(adults),
-                checkInDate=checkin,
-                checkOutDate=checkout,
-            )
-        except ResponseError as e:
-            raise RuntimeError(str(e))
+        data = self._fetch_offers(hotel_ids, adults, checkin, checkout)
 
         nights = max(1, _nights_between(checkin, checkout))
 
         out = []
-        for item in (offers.data or []):
+        for item in data:
             hotel_info = item.get("hotel", {}) or {}
             name = hotel_info.get("name") or "Unknown"
             rating = hotel_info.get("rating") or hotel_info.get("hotelRating")
             hotel_id = hotel_info.get("hotelId") or item.get("hotelId")
 
-            cheapest_total = None
-            cheapest_offer_id = None
-
-            for off in (item.get("offers") or []):
-                total = off.get("price", {}).get("total")
-                if total is None:
-                    continue
-                try:
-                    total_f = float(total)
-                except Exception:
-                    continue
-
-                if cheapest_total is None or total_f < cheapest_total:
-                    cheapest_total = total_f
-                    cheapest_offer_id = off.get("id")
-
-            if cheapest_total is None:
+            # each offer's total parsed once; unpriceable offers are skipped
+            best = min(
+                ((t, off) for off in (item.get("offers") or []) if (t := _offer_total(off)) is not None),
+                key=_FIRST,
+                default=None,
+            )
+            if best is None:
                 continue
+            cheapest_total, cheapest_offer_id = best[0], best[1].get("id")
 
             out.append({
                 "name": name,
@@ -139,7 +153,18 @@ class AmadeusHotelsProvider(HotelsProvider):
                 "offer_id": cheapest_offer_id,
             })
 
-        return sorted(out, key=lambda x: x["price_total_inr"])
+        out.sort(key=_BY_TOTAL)
+        return out
+
+
+def _offer_total(off: dict) -> Optional[float]:
+    total = (off.get("price") or {}).get("total")
+    if total is None:
+        return None
+    try:
+        return float(total)
+    except (TypeError, ValueError):
+        return None
 
 
 def _nights_between(checkin_iso: str, checkout_iso: str) -> int:
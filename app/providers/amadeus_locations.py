@@ -0,0 +1,69 @@
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from amadeus import Client
+
+
+_IATA_RE = re.compile(r"[A-Za-z]{3}")
+
+
+def as_iata(text: str) -> Optional[str]:
+    """User text that already is an IATA code ('del', 'JFK') -> 'DEL' / 'JFK', else None."""
+    return text.upper() if _IATA_RE.fullmatch(text) else None
+
+
+def search_locations(client: Client, keyword: str, sub_type: str) -> tuple:
+    """
+    Airport & City Search (reference_data.locations.get), memoized for the
+    process and shared by every Amadeus provider: "Delhi" -> DEL costs one
+    round trip, not one per provider or per request.
+    ResponseError propagates and is not cached, so failures are retried; an
+    empty result is not cached either (test environment, partial outage).
+    """
+    try:
+        return _search_locations(client, normalize_keyword(keyword), sub_type)
+    except _NoLocations:
+        return ()
+
+
+@lru_cache(maxsize=1024)
+def normalize_keyword(text: str) -> str:
+    """
+    Case- and diacritic-insensitive form of a place name: "zürich", "Zurich"
+    and "ZURICH" share one cache entry, and the API (ASCII-only keyword) sees
+    "ZURICH" instead of rejecting the accented form.
+    """
+    folded = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(folded.split()).upper()
+
+
+class _NoLocations(Exception):
+    """Raised instead of returning (), since lru_cache never caches a raise."""
+
+
+@lru_cache(maxsize=4096)
+def _search_locations(client: Client, keyword: str, sub_type: str) -> tuple:
+    # callers only read the items
+    resp = client.reference_data.locations.get(keyword=keyword, subType=sub_type)
+    data = tuple(resp.data or ())
+    if not data:
+        raise _NoLocations
+    return data
+
+
+# the SDK is blocking; a second location lookup runs here while the first runs inline
+_RESOLVE_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="amadeus-resolve")
+
+
+def resolve_pair(resolve, first: tuple, second: tuple) -> tuple:
+    """
+    resolve(*first), resolve(*second) concurrently, e.g. origin + destination:
+    two uncached lookups cost one round trip instead of two. Errors surface in
+    the same order as the sequential calls (first, then second).
+    """
+    fut = _RESOLVE_POOL.submit(resolve, *second)
+    a = resolve(*first)
+    return a, fut.result()
@@ -1,5 +1,9 @@
 from abc import ABC, abstractmethod
 
+# Providers return offers sorted cheapest first; agents keep only this many
+# (the UI renders the top 10 and charts at most 12).
+RESULTS_TOP_N = 12
+
 class FlightsProvider(ABC):
     @abstractmethod
     def search_flights(self, origin: str, destination: str, date_iso: str) -> list[dict]:
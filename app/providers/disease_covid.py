@@ -1,15 +1,38 @@
 from __future__ import annotations
 
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
 from typing import Any, Dict, Optional, List, Tuple
-import requests
-from datetime import datetime
+from datetime import date
+
+from app.providers._http import SESSION
 
 
 class CovidProviderError(Exception):
     pass
 
 
+_BY_ISO = itemgetter(1)
+_HISTORY_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="covid-history")
+
+# disease.sh refreshes country stats roughly every 10 minutes
+BUNDLE_CACHE_TTL_SEC = 10 * 60
+
+
+@lru_cache(maxsize=4096)
+def _mdyy_to_iso(mdyy: str) -> Optional[str]:
+    # '1/22/20' -> '2020-01-22' (None if malformed). Every country's timeline
+    # uses the same ~1.1k keys, so after the first bundle this is a dict hit.
+    try:
+        m, d, y = mdyy.split("/")
+        return date(2000 + int(y), int(m), int(d)).isoformat()
+    except (AttributeError, ValueError):
+        return None
+
+
 class DiseaseCovidProvider:
     """
     Uses disease.sh API (no API key).
@@ -20,10 +43,19 @@ class DiseaseCovidProvider:
 
     def __init__(self, timeout: int = 15):
         self.timeout = timeout
+        self._session = SESSION
+        # cache: normalized country -> (expires_at, bundle); filled by prefetch or a real fetch
+        self._bundle_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # cache: normalized country -> (day, (daily cases, daily deaths, last 14 days))
+        self._series_cache: Dict[str, Tuple[str, Tuple[list, list, list]]] = {}
+
+    def warmup(self) -> None:
+        # open the keep-alive connection (DNS + TLS) ahead of the first request
+        self._session.head(self.BASE_URL, timeout=self.timeout)
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
         url = f"{self.BASE_URL}{path}"
-        r = requests.get(url, params=params or {}, timeout=self.timeout)
+        r = self._session.get(url, params=params or {}, timeout=self.timeout)
         if r.status_code >= 400:
             raise CovidProviderError(f"COVID API error {r.status_code}: {r.text[:200]}")
         return r.json()
@@ -35,67 +67,73 @@ class DiseaseCovidProvider:
         return self._get(f"/v3/covid-19/historical/{country}", params={"lastdays": "all"})
 
     @staticmethod
-    def _parse_mdyy_to_iso(mdyy: str) -> str:
+    def _compute_daily_pair(cases_cum: Dict[str, int], deaths_cum: Dict[str, int]) -> Tuple[list, list, list]:
         """
-        disease.sh date keys look like: '1/22/20'
-        Convert to ISO: '2020-01-22'
+        Daily new cases, daily new deaths and the combined last-14-days rows,
+        on one shared sorted date axis in a single pass. A date missing from
+        one series counts as no change there, so the three always line up.
         """
-        dt = datetime.strptime(mdyy, "%m/%d/%y")
-        return dt.strftime("%Y-%m-%d")
-
-    @staticmethod
-    def _sorted_items_by_date(cumulative_by_date: Dict[str, int]) -> List[Tuple[str, int]]:
+        cases_cum = cases_cum or {}
+        deaths_cum = deaths_cum or {}
+        axis = {}
+        for k in (*cases_cum, *deaths_cum):
+            if k not in axis:
+                iso = _mdyy_to_iso(k)
+                if iso is not None:
+                    axis[k] = iso
+
+        cases: List[Dict[str, int]] = []
+        deaths: List[Dict[str, int]] = []
+        last14: List[Dict[str, Any]] = []
+        tail_from = len(axis) - 14
+        prev_c = prev_d = None
+        for i, (k, iso) in enumerate(sorted(axis.items(), key=_BY_ISO)):
+            c = int(cases_cum.get(k) or 0) if k in cases_cum else prev_c or 0
+            d = int(deaths_cum.get(k) or 0) if k in deaths_cum else prev_d or 0
+            new_c = c - prev_c if prev_c is not None and c > prev_c else 0
+            new_d = d - prev_d if prev_d is not None and d > prev_d else 0
+            prev_c, prev_d = c, d
+            cases.append({"date": iso, "value": new_c})
+            deaths.append({"date": iso, "value": new_d})
+            if i >= tail_from:
+                last14.append({"date": iso, "new_cases": new_c, "new_deaths": new_d})
+        return cases, deaths, last14
+
+    def _daily_series(self, country: str) -> Tuple[list, list, list]:
         """
-        Ensure we sort by actual date (not string order).
-        Input keys like '1/2/20' will sort wrong if treated as strings.
+        (daily cases, daily deaths, last 14 days) from the full historical
+        timeline. The timeline only gains a point per day, so it is fetched and
+        converted once per country per day; bundle refreshes only re-fetch
+        latest stats.
         """
-        items = []
-        for k, v in (cumulative_by_date or {}).items():
-            try:
-                dt = datetime.strptime(k, "%m/%d/%y")
-            except Exception:
-                continue
-            items.append((dt, int(v) if v is not None else 0))
-        items.sort(key=lambda x: x[0])
-        return [(d.strftime("%m/%d/%y"), v) for d, v in items]
-
-    @classmethod
-    def _compute_daily_new(cls, cumulative_by_date: Dict[str, int]) -> List[Dict[str, int]]:
-        """
-        Convert cumulative series -> list of {date, value} daily new series.
-        Dates returned in ISO format (YYYY-MM-DD).
-        """
-        items = cls._sorted_items_by_date(cumulative_by_date)
-        out: List[Dict[str, int]] = []
-        prev = None
-        for d, v in items:
-            if prev is None:
-                daily = 0
-            else:
-                daily = max(0, int(v) - int(prev))
-            prev = v
-            out.append({"date": cls._parse_mdyy_to_iso(d), "value": daily})
-        return out
+        key = (country or "").strip().lower()
+        today = date.today().isoformat()
+        hit = self._series_cache.get(key)
+        if hit and hit[0] == today:
+            return hit[1]
 
-    def fetch_country_bundle(self, country: str) -> Dict[str, Any]:
-        latest = self.get_latest_country(country)
         hist = self.get_history_country_all(country)
-
         timeline = (hist or {}).get("timeline") or {}
-        cases_cum = timeline.get("cases") or {}
-        deaths_cum = timeline.get("deaths") or {}
-
-        # ✅ Full series (2020 → today)
-        series_daily_cases = self._compute_daily_new(cases_cum)
-        series_daily_deaths = self._compute_daily_new(deaths_cum)
-
-        # last 14 days (optional)
-        last14_cases = series_daily_cases[-14:] if len(series_daily_cases) >= 14 else series_daily_cases
-        last14_deaths = series_daily_deaths[-14:] if len(series_daily_deaths) >= 14 else series_daily_deaths
-        last14 = [
-            {"date": last14_cases[i]["date"], "new_cases": last14_cases[i]["value"], "new_deaths": last14_deaths[i]["value"] if i < len(last14_deaths) else 0}
-            for i in range(len(last14_cases))
-        ]
+        series = self._compute_daily_pair(timeline.get("cases"), timeline.get("deaths"))
+        self._series_cache[key] = (today, series)
+        return series
+
+    def fetch_country_bundle(self, country: str) -> Dict[str, Any]:
+        key = (country or "").strip().lower()
+        hit = self._bundle_cache.get(key)
+        if hit and hit[0] > time.monotonic():
+            return hit[1]
+
+        bundle = self._build_country_bundle(country)
+        self._bundle_cache[key] = (time.monotonic() + BUNDLE_CACHE_TTL_SEC, bundle)
+        return bundle
+
+    def _build_country_bundle(self, country: str) -> Dict[str, Any]:
+        # ✅ Full series (2020 → today) and last 14 days (optional), built in one
+        # pass; on a cold day the history call overlaps the latest-stats call
+        series_fut = _HISTORY_POOL.submit(self._daily_series, country)
+        latest = self.get_latest_country(country)
+        series_daily_cases, series_daily_deaths, last14 = series_fut.result()
 
         return {
             "country": latest.get("country") or country,
@@ -1,93 +1,261 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request
 from dotenv import load_dotenv
-import uuid
+import hashlib
+import orjson
+import os
+import threading
+import secrets
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from functools import cache
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app import init_db
 from app.db import SessionLocal
 from app.models import Conversation, Message
-from app.graph.graph import build_graph
+from app.graph.graph import build_graph, warmup_providers
 
 load_dotenv()
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
-graph = build_graph()
+
+
+def _json_response(data, status: int = 200):
+    # orjson instead of jsonify: the results/trace payload is the bulk of every
+    # response; non-str keys and unknown types are stringified like json did
+    body = orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+def _render_index() -> tuple[bytes, str]:
+    body = app.jinja_env.get_template("index.html").render().encode("utf-8")
+    return body, hashlib.sha1(body).hexdigest()
+
+
+# index.html has no template variables: render it once, not per hit
+_cached_index = cache(_render_index)
+
+
+def _index_page() -> tuple[bytes, str]:
+    # debug / template auto-reload: re-render so edits show up
+    if app.debug or app.config.get("TEMPLATES_AUTO_RELOAD"):
+        return _render_index()
+    return _cached_index()
 
 
 @app.get("/")
 def index():
-    return render_template("index.html")
+    body, etag = _index_page()
+    resp = app.response_class(body, mimetype="text/html")
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 3600
+    # 304 without a body when the browser already has this version
+    return resp.make_conditional(request)
+
+
+# (conversation_id, message) -> response of the turn currently running for it
+_INFLIGHT: "dict[tuple[str, str], Future]" = {}
+_INFLIGHT_LOCK = threading.Lock()
 
 
 @app.post("/chat")
 def chat():
-    body = request.get_json(force=True) or {}
+    # orjson reads the raw bytes directly (no str decode, no content-type check)
+    raw = request.get_data(cache=False)
+    try:
+        body = orjson.loads(raw) if raw else {}
+    except orjson.JSONDecodeError:
+        return _json_response({"error": "invalid JSON body"}, 400)
+    if not isinstance(body, dict):
+        return _json_response({"error": "JSON body must be an object"}, 400)
     user_input = (body.get("message") or "").strip()
     if not user_input:
-        return jsonify({"error": "message is required"}), 400
+        return _json_response({"error": "message is required"}, 400)
 
-    conversation_id = (body.get("conversation_id") or "").strip() or uuid.uuid4().hex
+    conversation_id = (body.get("conversation_id") or "").strip() or secrets.token_hex(16)
 
-    db = SessionLocal()
-    try:
-        conv = db.get(Conversation, conversation_id)
-        if not conv:
-            conv = Conversation(id=conversation_id, context={})
-            db.add(conv)
-            db.commit()
-            db.refresh(conv)
-
-        # store user message
-        db.add(Message(
-            conversation_id=conversation_id,
-            role="user",
-            content=user_input,
-            meta={}
-        ))
-        db.commit()
-
-        ctx = conv.context or {}
-        # Run LangGraph with ctx memory
-        state = {
-            "conversation_id": conversation_id,
-            "user_input": user_input,
-            "convo_context": ctx,
-        }
-        out = graph.invoke(state)
-
-        # Save updated context
-        updated_ctx = out.get("updated_context")
-        if isinstance(updated_ctx, dict):
-            conv.context = updated_ctx
-            db.add(conv)
-            db.commit()
-
-        assistant_reply = out.get("reply", "") or ""
-
-        db.add(Message(
-            conversation_id=conversation_id,
-            role="assistant",
-            content=assistant_reply,
-            meta={
-                "trace": out.get("trace", []),
-                "results": out.get("results", {}),
-                "next_question": out.get("next_question")
-            }
-        ))
-        db.commit()
-
-        return jsonify({
-            "conversation_id": conversation_id,
-            "reply": assistant_reply,
-            "next_question": out.get("next_question"),
-            "results": out.get("results", {}),
-            "trace": out.get("trace", []),
-            "context": conv.context
-        })
+    key = (conversation_id, user_input)
+    with _INFLIGHT_LOCK:
+        turn = _INFLIGHT.get(key)
+        owner = turn is None
+        if owner:
+            turn = _INFLIGHT[key] = Future()
+    if not owner:
+        # same message while it is still being answered (double-click / retry):
+        # share that turn's response instead of running the graph again
+        return _json_response(turn.result())
 
+    try:
+        payload = _chat_turn(conversation_id, user_input)
+    except BaseException as e:
+        turn.set_exception(e)
+        raise
+    else:
+        turn.set_result(payload)
     finally:
-        db.close()
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+    return _json_response(payload)
+
+
+def _chat_turn(conversation_id: str, user_input: str) -> dict:
+    # message timestamps come from the request, not from when the write lands
+    asked_at = datetime.now(timezone.utc)
+
+    # the previous turn's write must land before its context is read back
+    # (only guaranteed for turns served by this process, see _PERSIST_PENDING)
+    _wait_persisted(conversation_id)
+
+    # read the memory; the session (and its pooled connection) is released
+    # before the graph runs, so slow LLM / provider calls don't pin a connection
+    with SessionLocal() as db:
+        stored = db.execute(
+            select(Conversation.context).where(Conversation.id == conversation_id)
+        ).first()
+    ctx = (stored[0] if stored else None) or {}
+
+    # Run LangGraph with ctx memory
+    # per-turn outputs are reset explicitly so a checkpointed thread
+    # doesn't carry last turn's reply/trace/results into this one
+    state = {
+        "conversation_id": conversation_id,
+        "user_input": user_input,
+        "convo_context": ctx,
+        "updated_context": None,
+        "llm_actions": [],
+        "reply": "",
+        "next_question": None,
+        "results": {},
+        "trace": [],
+    }
+    # compiled on first use and cached for the process, not at import
+    out = build_graph().invoke(state, config={"configurable": {"thread_id": conversation_id}})
+
+    updated_ctx = out.get("updated_context")
+    if isinstance(updated_ctx, dict):
+        # history is a bounded deque inside the graph; JSONB needs a list
+        ctx = {**updated_ctx, "history": list(updated_ctx.get("history") or [])}
+
+    # read the outputs once; the stored meta and the response share these objects
+    assistant_reply = out.get("reply", "") or ""
+    results = out.get("results", {})
+    next_q = out.get("next_question")
+    # trace is a bounded deque inside the graph; JSONB / the response need a list
+    trace = list(out.get("trace") or [])
+
+    meta = {
+        "trace": trace,
+        "results": results,
+        "next_question": next_q
+    }
+    # the client doesn't wait for the write; the next turn of this conversation does
+    write_ctx = None
+    if stored is None or isinstance(updated_ctx, dict):
+        write_ctx = _context_write(stored[0] if stored else None, ctx)
+    _schedule_persist(
+        conversation_id, write_ctx,
+        (user_input, asked_at), (assistant_reply, datetime.now(timezone.utc)), meta,
+    )
+
+    return {
+        "conversation_id": conversation_id,
+        "reply": assistant_reply,
+        "next_question": next_q,
+        "results": results,
+        "trace": trace,
+        "context": ctx
+    }
+
+
+# ---------------------------
+# Turn persistence (off the response path)
+# ---------------------------
+_PERSIST_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="persist-turn")
+# conversation_id -> its latest not-yet-finished write. Per process: with
+# several workers, a follow-up turn served by another worker can read the
+# context before this write lands (stale by one turn); route a conversation
+# to one worker, or write the context synchronously, if that matters.
+_PERSIST_PENDING: "dict[str, Future]" = {}
+_PERSIST_LOCK = threading.Lock()
+
+
+def _context_write(old: dict | None, new: dict) -> tuple[dict, bool] | None:
+    """
+    What this turn stores in Conversation.context: (new, False) replaces the
+    column, (patch, True) merges only the changed top-level keys, None skips
+    the write because nothing changed.
+    """
+    if not old or old.keys() - new.keys():
+        return new, False
+    patch = {k: v for k, v in new.items() if k not in old or old[k] != v}
+    return (patch, True) if patch else None
+
+
+def _persist_turn(conversation_id: str, ctx_write: tuple[dict, bool] | None,
+                  asked: tuple[str, datetime], answered: tuple[str, datetime], meta: dict) -> None:
+    # one transaction for the whole turn: conversation + context, user and
+    # assistant messages; commits on exit, rolls back on error
+    with SessionLocal.begin() as db:
+        if ctx_write is not None:
+            ctx, merge = ctx_write
+            # one statement for new and existing conversations; also safe when
+            # two first turns of the same conversation race
+            stmt = pg_insert(Conversation).values(id=conversation_id, context=ctx)
+            # merge: jsonb || sends and rewrites only the keys this turn changed
+            value = Conversation.context.op("||")(stmt.excluded.context) if merge else stmt.excluded.context
+            db.execute(stmt.on_conflict_do_update(index_elements=[Conversation.id], set_={"context": value}))
+        # both messages in one multi-row Core INSERT against the table: no ORM
+        # objects, bulk-insert bookkeeping or RETURNING; nothing reads them back.
+        # created_at is explicit: server_default now() is the transaction start,
+        # which would give both rows the same (and a post-response) timestamp
+        (user_input, asked_at), (reply, answered_at) = asked, answered
+        db.execute(insert(Message.__table__), [
+            {"conversation_id": conversation_id, "role": "user", "content": user_input,
+             "meta": {}, "created_at": asked_at},
+            {"conversation_id": conversation_id, "role": "assistant", "content": reply,
+             "meta": meta, "created_at": answered_at},
+        ])
+
+
+def _schedule_persist(conversation_id: str, *args) -> None:
+    with _PERSIST_LOCK:
+        prev = _PERSIST_PENDING.get(conversation_id)
+        # chained behind the previous write, so a conversation's turns land in order
+        fut = _PERSIST_POOL.submit(_persist_after, prev, conversation_id, *args)
+        _PERSIST_PENDING[conversation_id] = fut
+
+    def done(f: Future) -> None:
+        with _PERSIST_LOCK:
+            if _PERSIST_PENDING.get(conversation_id) is f:
+                del _PERSIST_PENDING[conversation_id]
+        if f.exception() is not None:
+            app.logger.error("persisting turn for %s failed", conversation_id, exc_info=f.exception())
+
+    fut.add_done_callback(done)
+
+
+def _persist_after(prev: Future | None, conversation_id: str, *args) -> None:
+    if prev is not None:
+        wait([prev])
+    _persist_turn(conversation_id, *args)
+
+
+def _wait_persisted(conversation_id: str) -> None:
+    with _PERSIST_LOCK:
+        fut = _PERSIST_PENDING.get(conversation_id)
+    if fut is not None:
+        wait([fut])
 
 
 if __name__ == "__main__":
-    init_db()
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    debug = True
+    # the debug reloader runs this block in a watcher and in the serving
+    # child; only the process that serves requests warms the DB pool and providers
+    serving = not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    init_db(warm=serving)
+    if serving:
+        warmup_providers()
+    app.run(host="0.0.0.0", port=5000, debug=debug)
@@ -1,16 +1,13 @@
 import pycountry
+from types import MappingProxyType
 from typing import Optional
 
+# ISO-2 -> name, built once at import (pycountry loads its database on first access)
+_ISO2_TO_NAME = MappingProxyType({c.alpha_2: c.name for c in pycountry.countries})
+
 
 def iso2_to_country_name(code: str) -> Optional[str]:
     """
     Convert ISO-2 country code (e.g. 'IN') to country name ('India')
     """
-    if not code:
-        return None
-
-    try:
-        country = pycountry.countries.get(alpha_2=code.upper())
-        return country.name if country else None
-    except Exception:
-        return None
+    return _ISO2_TO_NAME.get(code.upper()) if code else None
@@ -0,0 +1,66 @@
+import pytest
+
+from app.graph import graph as g
+from app.graph.state import QKey
+
+
+def _branch(reply, next_q, key, results=None):
+    def node(state):
+        return {
+            "reply": reply,
+            "next_question": next_q,
+            "updated_context": {"last_question_key": key},
+            "results": results or {},
+        }
+    return node
+
+
+@pytest.fixture
+def nodes(monkeypatch):
+    table = {
+        "covid": _branch(
+            "Covid totals.\n\n" + g._Q_HOTEL_AFTER_COVID, g._Q_HOTEL_AFTER_COVID,
+            QKey.ASK_HOTEL_AFTER_COVID, {"covid": {}},
+        ),
+        "hotels": _branch("Check-out date?", "Check-out date?", QKey.ASK_USER),
+    }
+    monkeypatch.setattr(g, "_FANOUT_NODES", table)
+    return table
+
+
+def _state():
+    return {
+        "slots": {},
+        "results": {},
+        "trace": [],
+        "convo_context": {"last_question_key": QKey.AFTER_FLIGHT_NEXT_STEP},
+    }
+
+
+def test_missing_slot_question_wins(nodes):
+    out = g._run_fanout(_state(), ["covid", "hotels"])
+    assert out["reply"] == "Covid totals.\n\nCheck-out date?"
+    assert out["updated_context"]["last_question_key"] == QKey.ASK_USER
+
+
+def test_follow_up_for_action_already_run_is_dropped(nodes):
+    nodes["hotels"] = _branch(
+        "Hotel list.\n\n" + g._Q_CABS_AFTER_HOTELS, g._Q_CABS_AFTER_HOTELS,
+        QKey.ASK_CABS_AFTER_HOTELS, {"hotels": {}},
+    )
+    out = g._run_fanout(_state(), ["covid", "hotels"])
+    assert g._Q_HOTEL_AFTER_COVID not in out["reply"]
+    assert out["reply"].endswith(g._Q_CABS_AFTER_HOTELS)
+    assert out["updated_context"]["last_question_key"] == QKey.ASK_CABS_AFTER_HOTELS
+
+
+def test_bundle_with_dropped_cabs_moves_to_open_ended(nodes):
+    nodes["hotels"] = _branch(
+        "Hotel list.\n\n" + g._Q_CABS_AFTER_HOTELS, g._Q_CABS_AFTER_HOTELS,
+        QKey.ASK_CABS_AFTER_HOTELS, {"hotels": {}},
+    )
+    nodes["cabs"] = _branch("No transfers found.", "No transfers found.", QKey.AFTER_FLIGHT_NEXT_STEP)
+    out = g._run_fanout(_state(), ["covid", "hotels", "cabs"], speculative=("cabs",))
+    assert out["reply"] == "Covid totals.\n\nHotel list.\n\n" + g._Q_ANYTHING_ELSE
+    assert out["next_question"] == g._Q_ANYTHING_ELSE
+    assert out["updated_context"]["last_question_key"] == QKey.OPEN_ENDED
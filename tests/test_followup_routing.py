@@ -0,0 +1,60 @@
+import pytest
+
+from app.graph import graph as g
+from app.graph.state import QKey
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = []
+    monkeypatch.setattr(g, "_master_reply", lambda state, ctx2, q, key: seen.append(("reply", key)))
+    monkeypatch.setattr(g, "_master_route", lambda state, ctx2, action, *a: seen.append(("route", action)))
+    monkeypatch.setattr(g, "_resolve_country_from_destination", lambda state: None)
+    return seen
+
+
+def _route(text):
+    g._route_after_flight({"llm_actions": []}, {}, {"destination": "Paris", "date": "2026-11-01"}, text)
+
+
+def test_no_thats_all_is_not_the_bundle(calls):
+    _route("no, that's all")
+    assert calls == [("reply", QKey.OPEN_ENDED)]
+
+
+def test_all_for_people_is_not_the_bundle(calls):
+    _route("hotel for all of us")
+    assert calls == [("route", "hotels")]
+
+
+@pytest.mark.parametrize("text", ["all", "everything", "all three", "all of them please"])
+def test_bundle_wording_runs_the_bundle(calls, text):
+    _route(text)
+    assert calls == [("route", "flight_bundle")]
+
+
+def test_no_followed_by_a_request_is_not_a_no_after_flights(calls):
+    _route("no, but I need a cab")
+    assert calls == [("reply", QKey.AFTER_FLIGHT_NEXT_STEP)]
+
+
+@pytest.mark.parametrize("route", [g._route_open_ended, g._route_cabs_after_hotels, g._route_hotel_after_covid])
+@pytest.mark.parametrize("text", ["no, book a flight to goa on 2026-11-02", "no, but i need a cab"])
+def test_no_with_a_new_request_goes_to_the_planner(calls, route, text):
+    assert route({}, {}, {"destination": "Goa"}, text) is None
+    assert calls == []
+
+
+@pytest.mark.parametrize("route", [g._route_open_ended, g._route_cabs_after_hotels, g._route_hotel_after_covid])
+def test_plain_no_is_still_a_no(calls, route):
+    route({}, {}, {}, "no")
+    assert calls == [("reply", QKey.OPEN_ENDED)]
+
+
+def test_yes_to_transport_goes_airport_to_offered_hotel(monkeypatch):
+    seen = []
+    monkeypatch.setattr(g, "_master_route", lambda state, ctx2, action, slots, *a: seen.append((action, slots)))
+    ctx2 = {"results_summary": {"hotels": {"count": 3, "cheapest": {"name": "Sea View Inn"}}}}
+    old = {"destination": "Goa", "pickup": "Mumbai Airport", "dropoff": "Old Hotel"}
+    g._route_cabs_after_hotels({}, ctx2, old, "yes")
+    assert seen == [("cabs", {"destination": "Goa", "pickup": "Goa Airport", "dropoff": "Sea View Inn"})]